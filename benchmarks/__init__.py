@@ -0,0 +1,12 @@
+"""
+Benchmarks for the API. The application modules live flat inside ./src/ (that is
+how gunicorn imports them), so make them importable before anything else runs.
+
+Run them from the project root, for example:  python -m benchmarks.serializers
+"""
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
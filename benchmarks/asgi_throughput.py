@@ -0,0 +1,112 @@
+"""
+Requests per second of one process serving catalog and favorites reads: the Flask
+app on a single-threaded WSGI server (what a sync gunicorn worker does) against
+asgi.py on one uvicorn worker, with the same number of concurrent clients.
+
+    python -m benchmarks.asgi_throughput [clients] [seconds]
+
+Uses a scratch SQLite database unless BENCH_DATABASE_URL is set. A local SQLite
+file answers in microseconds, so async only pays off against a database that
+makes the worker wait (Postgres over the network): point BENCH_DATABASE_URL at one
+to see the difference the async mode is for. Needs uvicorn and the async driver.
+"""
+import os
+import sys
+import time
+import threading
+import subprocess
+import http.client
+from benchmarks.common import use_scratch_database, seed_catalog, percentile, free_port, wait_for
+
+CLIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+PATHS = ["/character?limit=20", "/planets/3", "/starship?limit=20&sort=name", "/favorites/1?expand=true"]
+
+SERVERS = {
+    "sync WSGI, 1 thread": [
+        sys.executable, "-c",
+        "import sys, logging; from werkzeug.serving import run_simple; from app import create_app; "
+        "logging.getLogger('werkzeug').setLevel(logging.WARNING); "
+        "run_simple('127.0.0.1', int(sys.argv[1]), create_app(), threaded=False)",
+    ],
+    "ASGI, uvicorn": [
+        sys.executable, "-m", "uvicorn", "asgi:app", "--app-dir", SRC,
+        "--host", "127.0.0.1", "--log-level", "warning", "--port",
+    ],
+}
+
+
+def drive(port):
+    stop = threading.Event()
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        mine = []
+        i = offset
+        while not stop.is_set():
+            start = time.perf_counter()
+            connection.request("GET", PATHS[i % len(PATHS)])
+            response = connection.getresponse()
+            response.read()
+            if response.will_close:
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port)
+            mine.append(time.perf_counter() - start)
+            assert response.status == 200, response.status
+            i += 1
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(CLIENTS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    if os.getenv("BENCH_DATABASE_URL"):
+        os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+    else:
+        use_scratch_database()
+    os.environ["RESPONSE_CACHE_URL"] = "none"
+    sys.path.insert(0, SRC)
+    from app import create_app, bcrypt
+    app = create_app()
+    from models import db, User, Favorite_character, Favorite_planet
+
+    with app.app_context():
+        db.create_all()
+        if not db.session.execute(db.select(User.id).limit(1)).first():
+            seed_catalog(db, characters=5000, planets=500, starships=500)
+            db.session.add(User(username="bench", mail="bench@example.com",
+                                password=bcrypt.generate_password_hash("bench").decode("utf-8")))
+            db.session.flush()
+            db.session.add_all([Favorite_character(user_id=1, character_id=i) for i in range(1, 21)])
+            db.session.add_all([Favorite_planet(user_id=1, planet_id=i) for i in range(1, 6)])
+            db.session.commit()
+
+    env = dict(os.environ, PYTHONPATH=SRC)
+    print("%d concurrent clients, %.0fs per server, database %s" % (CLIENTS, SECONDS, os.environ["DATABASE_URL"]))
+    for label, command in SERVERS.items():
+        port = free_port()
+        server = subprocess.Popen(command + [str(port)], cwd=SRC, env=env)
+        try:
+            wait_for(port)
+            latencies, elapsed = drive(port)
+        finally:
+            server.terminate()
+            server.wait()
+        print("%-22s %7.0f req/s   p50 %7.2f ms  p99 %7.2f ms" % (
+            label, len(latencies) / elapsed, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000))
+
+
+if __name__ == "__main__":
+    main()
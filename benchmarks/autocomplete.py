@@ -0,0 +1,90 @@
+"""
+Type-ahead latency: the in-process prefix index behind /autocomplete against the
+equivalent `name ILIKE 'x%'` query, both driven through the Flask test client by
+several threads at once.
+
+    python -m benchmarks.autocomplete [names] [requests] [threads]
+"""
+import sys
+import time
+import random
+import threading
+from benchmarks.common import use_scratch_database, seed_catalog
+
+NAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+REQUESTS = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+THREADS = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def run_load(app, path_for, prefixes):
+    latencies = []
+    lock = threading.Lock()
+    per_thread = REQUESTS // THREADS
+
+    def worker(seed):
+        client = app.test_client()
+        rng = random.Random(seed)
+        mine = []
+        for _ in range(per_thread):
+            path = path_for(rng.choice(prefixes))
+            start = time.perf_counter()
+            response = client.get(path)
+            mine.append(time.perf_counter() - start)
+            assert response.status_code == 200
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    use_scratch_database()
+    import cache
+    cache.response_cache.backend = None
+    from flask import request, jsonify
+    from app import create_app
+    app = create_app()
+    from models import db, Character
+    from autocomplete import autocomplete_index
+
+    @app.route("/bench/autocomplete-sql")
+    def autocomplete_sql():
+        prefix = request.args["prefix"].replace("%", "\\%").replace("_", "\\_")
+        rows = db.session.execute(
+            db.select(Character.id, Character.name)
+            .where(Character.name.ilike(prefix + "%", escape="\\"))
+            .order_by(Character.name, Character.id)
+            .limit(10)
+        )
+        return jsonify([{"type": "character", "id": i, "name": n} for i, n in rows])
+
+    with app.app_context():
+        db.create_all()
+        seed_catalog(db, characters=NAMES)
+        started = time.perf_counter()
+        autocomplete_index.warm()
+        print("names: %d, index built in %.0f ms" % (NAMES, (time.perf_counter() - started) * 1000))
+
+    prefixes = ["c", "ch", "cha", "character 1", "character 12", "character 123", "character 9", "x"]
+    for label, path_for in (
+        ("prefix index  /autocomplete", lambda p: "/autocomplete?kind=character&prefix=" + p),
+        ("ILIKE 'x%' query", lambda p: "/bench/autocomplete-sql?prefix=" + p),
+    ):
+        latencies, elapsed = run_load(app, path_for, prefixes)
+        print("%-28s p50 %6.2f ms  p99 %6.2f ms  %7.0f req/s" % (
+            label, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000, len(latencies) / elapsed))
+
+
+if __name__ == "__main__":
+    main()
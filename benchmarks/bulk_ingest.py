@@ -0,0 +1,63 @@
+"""
+Loads the same characters through one POST /character per record and through a
+single POST /character/bulk (JSON array and NDJSON), and compares the timings.
+
+    python -m benchmarks.bulk_ingest [records]
+"""
+import sys
+import json
+import time
+from benchmarks.common import use_scratch_database
+
+RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+
+def make_records(count, offset):
+    return [
+        {"name": "Bulk %d" % (offset + i), "gender": "n/a", "height": str(100 + i % 100), "mass": str(40 + i % 60)}
+        for i in range(count)
+    ]
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print("%-27s: %8.1f ms  (%8.0f records/s)" % (label, elapsed * 1000, RECORDS / elapsed))
+    return elapsed
+
+
+def main():
+    use_scratch_database()
+    import cache
+    cache.response_cache.backend = None
+    from app import create_app
+    app = create_app()
+    from models import db
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    def single_rows():
+        for record in make_records(RECORDS, 0):
+            assert client.post("/character", json=record).status_code == 200
+
+    def bulk_json():
+        response = client.post("/character/bulk", json=make_records(RECORDS, RECORDS))
+        assert response.json["inserted"] == RECORDS, response.json
+
+    def bulk_ndjson():
+        body = "\n".join(json.dumps(record) for record in make_records(RECORDS, 2 * RECORDS))
+        response = client.post("/character/bulk", data=body, content_type="application/x-ndjson")
+        assert response.json["inserted"] == RECORDS, response.json
+
+    print("records: %d" % RECORDS)
+    single = timed("POST /character x N", single_rows)
+    bulk = timed("POST /character/bulk JSON", bulk_json)
+    ndjson = timed("POST /character/bulk NDJSON", bulk_ndjson)
+    print("speed-up: %.0fx (JSON), %.0fx (NDJSON)" % (single / bulk, single / ndjson))
+
+
+if __name__ == "__main__":
+    main()
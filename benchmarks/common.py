@@ -0,0 +1,136 @@
+"""
+Helpers shared by the benchmarks: a throw-away SQLite database, catalog seeding,
+the search index, local servers and a tiny timer.
+"""
+import os
+import time
+import socket
+import tempfile
+import importlib.util
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations", "versions")
+
+
+def use_scratch_database():
+    """Points DATABASE_URL at a fresh SQLite file. Call it before importing `app`."""
+    path = os.path.join(tempfile.mkdtemp(prefix="starwars-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+    return path
+
+
+def character_row(i):
+    return {
+        "name": "Character %d" % i, "birth_year": "%dBBY" % (i % 900), "eye_color": "blue",
+        "hair_color": "brown", "skin_color": "fair", "gender": ("male", "female", "n/a")[i % 3],
+        "height": str(150 + i % 80), "mass": str(50 + i % 90),
+    }
+
+
+def planet_row(i):
+    return {
+        "name": "Planet %d" % i, "climate": ("arid", "temperate", "frozen")[i % 3],
+        "diameter": str(5000 + i % 15000), "gravity": "1 standard", "orbital_period": str(300 + i % 200),
+        "population": str(1000 * i), "rotation_period": str(20 + i % 10), "surface_water": str(i % 100),
+        "terrain": ("desert", "grasslands, mountains", "tundra, ice caves")[i % 3],
+    }
+
+
+def starship_row(i):
+    return {
+        "name": "Starship %d" % i, "model": "Model %d" % (i % 50), "MGLT": str(10 + i % 90),
+        "cargo_capacity": str(1000 * (i % 500)), "consumable": "1 year", "cost_in_credits": str(10000 + i),
+        "crew": str(1 + i % 40), "hyperdrive_rating": "1.0", "length": str(10 + i % 300),
+        "manufacturer": ("Corellian Engineering Corporation", "Kuat Drive Yards", "Incom Corporation")[i % 3],
+        "passangers": str(i % 600), "starship_class": ("corvette", "starfighter", "freighter")[i % 3],
+    }
+
+
+def seed_catalog(db, characters=0, planets=0, starships=0, batch_size=5000):
+    from models import Character, Planet, Starship
+
+    def fill(model, count, make_row):
+        for start in range(0, count, batch_size):
+            rows = [make_row(i) for i in range(start, min(start + batch_size, count))]
+            db.session.execute(db.insert(model), rows)
+        db.session.commit()
+
+    fill(Character, characters, character_row)
+    fill(Planet, planets, planet_row)
+    fill(Starship, starships, starship_row)
+
+
+def create_search_index(db, revision="25e9b5f068e7"):
+    """
+    Runs the full-text search migration on a database made with db.create_all(),
+    which does not know about the FTS tables (SQLite) or tsvector columns (Postgres).
+    """
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    spec = importlib.util.spec_from_file_location("search_migration", os.path.join(MIGRATIONS, revision + "_.py"))
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with db.engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            migration.upgrade()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server on port %d did not start" % port)
+
+
+def serve_gthread(port, threads):
+    """
+    Serves the app like one gunicorn gthread worker, for machines without gunicorn:
+    `threads` request threads, further connections wait until one is free.
+    """
+    import logging
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.serving import BaseWSGIServer
+    from app import create_app
+
+    class Server(BaseWSGIServer):
+
+        def process_request(self, request, client_address):
+            pool.submit(self.process_request_thread, request, client_address)
+
+        def process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    pool = ThreadPoolExecutor(max_workers=threads)
+    Server("127.0.0.1", port, create_app()).serve_forever()
+
+
+def best_of(repeat, func):
+    """Runs `func` `repeat` times and returns the fastest wall time in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,54 @@
+"""
+Catalog list pages plain, gzip and brotli (when installed): bytes on the wire and
+time per request with the response cache storing the encoded body against
+compressing on every request (cache off).
+
+    python -m benchmarks.compression [characters] [requests]
+"""
+import os
+import sys
+import tempfile
+from benchmarks.common import use_scratch_database, seed_catalog, best_of
+
+CHARACTERS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+REQUESTS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+PATHS = ["/character?limit=20", "/character?limit=100", "/planet?limit=100", "/starship?limit=100"]
+
+
+def main():
+    use_scratch_database()
+    os.environ["RESPONSE_CACHE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "cache.db")
+    import cache
+    from app import create_app
+    from compression import compressor
+    from models import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed_catalog(db, characters=CHARACTERS, planets=1000, starships=1000)
+
+    client = app.test_client()
+    backend = cache.response_cache.backend
+    print("%-22s %-8s %9s %7s %16s %16s" % ("path", "encoding", "bytes", "ratio", "cached ms/req", "uncached ms/req"))
+    for path in PATHS:
+        plain = len(client.get(path).data)
+        for encoding in (None,) + compressor.encodings:
+            headers = {"Accept-Encoding": encoding} if encoding else {}
+            size = len(client.get(path, headers=headers).data)
+
+            def run():
+                for _ in range(REQUESTS):
+                    client.get(path, headers=headers)
+
+            cache.response_cache.backend = backend
+            cached = best_of(3, run)
+            cache.response_cache.backend = None
+            uncached = best_of(3, run)
+            cache.response_cache.backend = backend
+            print("%-22s %-8s %9d %6.1fx %16.3f %16.3f" % (
+                path, encoding or "identity", size, plain / float(size),
+                cached / REQUESTS * 1000, uncached / REQUESTS * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Encoding and parsing large catalog lists with Flask's stdlib JSON provider and
+with the orjson one from json_provider.py, checking that both write the same
+bytes. Also times a whole /starship?limit=100 request with each provider
+(response cache off).
+
+    python -m benchmarks.json_provider [rows]
+"""
+import os
+import sys
+from benchmarks.common import use_scratch_database, seed_catalog, best_of
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+REPEAT = 5
+REQUESTS = 200
+
+
+def main():
+    use_scratch_database()
+    os.environ["RESPONSE_CACHE_URL"] = "none"
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_app
+    from json_provider import OrjsonProvider, orjson
+    from models import db, Character, Starship, serializer_for
+    if orjson is None:
+        sys.exit("orjson is not installed, nothing to compare")
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed_catalog(db, characters=ROWS, starships=ROWS)
+        payloads = {
+            model.__tablename__: serializer_for(model).rows(db.session.execute(serializer_for(model).select()))
+            for model in (Character, Starship)
+        }
+
+    providers = {"stdlib": DefaultJSONProvider(app), "orjson": OrjsonProvider(app)}
+    print("rows: %d (best of %d)" % (ROWS, REPEAT))
+    for name, items in payloads.items():
+        body = providers["stdlib"].dumps(items, separators=(",", ":"))
+        assert providers["orjson"].dumps(items, separators=(",", ":")) == body
+        assert providers["orjson"].loads(body.encode("utf-8")) == items
+        timings = {}
+        for label, provider in providers.items():
+            timings[label] = (
+                best_of(REPEAT, lambda: provider.dumps(items, separators=(",", ":"))),
+                best_of(REPEAT, lambda: provider.loads(body.encode("utf-8"))),
+            )
+        (std_dump, std_load), (fast_dump, fast_load) = timings["stdlib"], timings["orjson"]
+        print("%-10s %7d KB  encode %7.2f -> %6.2f ms (%4.1fx)  parse %7.2f -> %6.2f ms (%4.1fx)" % (
+            name, len(body) // 1024, std_dump * 1000, fast_dump * 1000, std_dump / fast_dump,
+            std_load * 1000, fast_load * 1000, std_load / fast_load))
+
+    client = app.test_client()
+    current = app.json
+    for label, provider_class in (("stdlib", DefaultJSONProvider), ("orjson", OrjsonProvider)):
+        app.json = provider_class(app)
+
+        def run():
+            for _ in range(REQUESTS):
+                client.get("/starship?limit=100")
+
+        print("GET /starship?limit=100 with %-6s %6.3f ms/request" % (label, best_of(3, run) / REQUESTS * 1000))
+    app.json = current
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Catalog latency during a login storm, served the way the Procfile deploys the app:
+one gunicorn gthread worker with WEB_THREADS threads (or an equivalent werkzeug
+server when gunicorn is not installed). A few clients read /character while many
+others POST /token as fast as they can, once with hashing effectively unbounded
+(one pool thread per storm client, like calling bcrypt inline) and once with the
+default PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE limits. Storm clients back off
+briefly on 503 the way a client honouring Retry-After would.
+
+    python -m benchmarks.login_storm [storm_clients] [seconds] [bcrypt_rounds]
+"""
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+import http.client
+import importlib.util
+from benchmarks.common import use_scratch_database, seed_catalog, percentile, free_port, wait_for
+
+STORM_CLIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+ROUNDS = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+WEB_THREADS = 8  # --threads of the Procfile
+READERS = 2
+BACKOFF = 0.05
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+LOGIN = json.dumps({"mail": "storm@example.com", "password": "hunter2"})
+
+
+def server_command(port):
+    if importlib.util.find_spec("gunicorn") is not None:
+        return [
+            sys.executable, "-m", "gunicorn", "wsgi", "--chdir", SRC, "--workers", "1",
+            "--worker-class", "gthread", "--threads", str(WEB_THREADS),
+            "--bind", "127.0.0.1:%d" % port, "--log-level", "warning",
+        ]
+    return [
+        sys.executable, "-c", "import sys; from benchmarks.common import serve_gthread; "
+        "serve_gthread(int(sys.argv[1]), int(sys.argv[2]))", str(port), str(WEB_THREADS),
+    ]
+
+
+def request(port, method, path, body=None):
+    # one connection per request, so an idle client never holds a server thread
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        headers = {"Content-Type": "application/json"} if body else {}
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def measure(port, storm):
+    stop = threading.Event()
+    latencies = []
+    logins = {"ok": 0, "busy": 0}
+    lock = threading.Lock()
+
+    def reader():
+        mine = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            status = request(port, "GET", "/character?limit=20")
+            mine.append(time.perf_counter() - start)
+            assert status == 200, status
+        with lock:
+            latencies.extend(mine)
+
+    def login():
+        while not stop.is_set():
+            status = request(port, "POST", "/token", LOGIN)
+            with lock:
+                logins["ok" if status == 200 else "busy"] += 1
+            if status == 503:
+                time.sleep(BACKOFF)
+
+    threads = [threading.Thread(target=reader) for _ in range(READERS)]
+    if storm:
+        threads += [threading.Thread(target=login) for _ in range(STORM_CLIENTS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, logins
+
+
+def main():
+    use_scratch_database()
+    os.environ["BCRYPT_LOG_ROUNDS"] = str(ROUNDS)
+    os.environ["RESPONSE_CACHE_URL"] = "none"
+    from app import create_app, bcrypt
+    from models import db, User
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed_catalog(db, characters=1000)
+        password = bcrypt.generate_password_hash("hunter2").decode("utf-8")
+        db.session.add(User(username="storm", mail="storm@example.com", password=password))
+        db.session.commit()
+
+    command = server_command(0)
+    print("storm clients: %d, bcrypt rounds: %d, %d cpus, %s with %d threads" % (
+        STORM_CLIENTS, ROUNDS, os.cpu_count(), "gunicorn gthread" if "gunicorn" in command else "werkzeug",
+        WEB_THREADS))
+    unbounded = {"PASSWORD_HASH_WORKERS": str(STORM_CLIENTS), "PASSWORD_HASH_QUEUE": str(STORM_CLIENTS)}
+    for label, limits, storm in (
+        ("no storm", {}, False),
+        ("storm, unbounded hashing", unbounded, True),
+        ("storm, bounded hashing", {}, True),
+    ):
+        port = free_port()
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, SRC]), **limits)
+        server = subprocess.Popen(server_command(port), cwd=ROOT, env=env)
+        try:
+            wait_for(port)
+            latencies, logins = measure(port, storm)
+        finally:
+            server.terminate()
+            server.wait()
+        print("%-26s catalog p50 %7.2f ms  p95 %7.2f ms  p99 %7.2f ms   logins ok %5d  503 %5d" % (
+            label, percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+            percentile(latencies, 99) * 1000, logins["ok"], logins["busy"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Compares the old read path (hydrate ORM objects, build the dict by hand) against
+the column-only serializers in models.py.
+
+    python -m benchmarks.serializers [rows]
+"""
+import sys
+from benchmarks.common import use_scratch_database, seed_catalog, best_of
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+REPEAT = 5
+
+
+def main():
+    use_scratch_database()
+    from app import create_app
+    app = create_app()
+    from models import db, Starship, serializer_for
+
+    serializer = serializer_for(Starship)
+
+    def hydrated():
+        db.session.expunge_all()
+        ships = Starship.query.all()
+        return [{field: getattr(ship, field) for field in serializer.fields} for ship in ships]
+
+    def column_only():
+        db.session.expunge_all()
+        return serializer.rows(db.session.execute(serializer.select()))
+
+    with app.app_context():
+        db.create_all()
+        seed_catalog(db, starships=ROWS)
+        assert hydrated() == column_only()
+
+        old = best_of(REPEAT, hydrated)
+        new = best_of(REPEAT, column_only)
+
+    per_10k = 10000.0 / ROWS
+    print("rows: %d (best of %d)" % (ROWS, REPEAT))
+    print("ORM hydration + dict  : %8.2f ms per 10k rows" % (old * 1000 * per_10k))
+    print("column-only serializer: %8.2f ms per 10k rows" % (new * 1000 * per_10k))
+    print("saving                : %8.2f ms per 10k rows (%.1fx)" % ((old - new) * 1000 * per_10k, old / new))
+
+
+if __name__ == "__main__":
+    main()
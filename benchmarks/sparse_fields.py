@@ -0,0 +1,48 @@
+"""
+Full catalog pages against sparse fieldsets (`?fields=`): bytes per page and time
+per request, response cache off so every request reads and serializes the rows.
+
+    python -m benchmarks.sparse_fields [rows] [requests]
+"""
+import os
+import sys
+from benchmarks.common import use_scratch_database, seed_catalog, best_of
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+REQUESTS = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+PATHS = [
+    "/starship?limit=500",
+    "/starship?limit=500&fields=name",
+    "/starship?limit=500&fields=name,model",
+    "/planet?limit=500",
+    "/planet?limit=500&fields=name",
+    "/planets/42",
+    "/planets/42?fields=name",
+]
+
+
+def main():
+    use_scratch_database()
+    os.environ["RESPONSE_CACHE_URL"] = "none"
+    from app import create_app
+    from models import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed_catalog(db, planets=ROWS, starships=ROWS)
+
+    client = app.test_client()
+    print("%-40s %9s %12s" % ("path", "bytes", "ms/request"))
+    for path in PATHS:
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+
+        def run():
+            for _ in range(REQUESTS):
+                client.get(path)
+
+        print("%-40s %9d %12.3f" % (path, len(response.data), best_of(3, run) / REQUESTS * 1000))
+
+
+if __name__ == "__main__":
+    main()
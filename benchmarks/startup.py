@@ -0,0 +1,102 @@
+"""
+Cold start: time to import the app module, build the app with create_app() and
+answer the first catalog request, each measured in a fresh interpreter the way a
+new gunicorn worker (or a free-tier instance waking up) pays for it. Runs with
+the default worker settings and with the admin UI and Flask-Migrate enabled.
+
+    python -m benchmarks.startup [runs] [--baseline FILE] [--save FILE]
+
+--save writes the medians to FILE; --baseline compares against such a file and
+exits with status 1 when a total is more than 25% (and 50 ms) slower.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from benchmarks.common import use_scratch_database
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+TOLERANCE = 1.25
+SLACK_MS = 50
+
+PROBE = r"""
+import json, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app()
+created = time.perf_counter()
+response = app.test_client().get("/character?limit=20")
+assert response.status_code == 200, response.status_code
+answered = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (answered - created) * 1000,
+    "total_ms": (answered - started) * 1000,
+}))
+"""
+
+MODES = {
+    "worker (defaults)": {"ENABLE_ADMIN": "0", "ENABLE_MIGRATE": "0"},
+    "admin + migrate": {"ENABLE_ADMIN": "1", "ENABLE_MIGRATE": "1"},
+}
+
+
+def probe(env):
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=SRC, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("runs", nargs="?", type=int, default=7)
+    parser.add_argument("--baseline")
+    parser.add_argument("--save")
+    args = parser.parse_args()
+
+    use_scratch_database()
+    os.environ["RESPONSE_CACHE_URL"] = "none"
+    sys.path.insert(0, SRC)
+    from app import create_app
+    from models import db
+    with create_app().app_context():
+        db.create_all()
+
+    results = {}
+    for label, overrides in MODES.items():
+        env = dict(os.environ, PYTHONPATH=SRC, **overrides)
+        env.pop("FLASK_RUN_FROM_CLI", None)
+        samples = [probe(env) for _ in range(args.runs)]
+        results[label] = {key: round(median([s[key] for s in samples]), 1) for key in samples[0]}
+        print("%-18s import %6.1f ms  create_app %6.1f ms  first request %6.1f ms  total %6.1f ms" % (
+            label, results[label]["import_ms"], results[label]["create_app_ms"],
+            results[label]["first_request_ms"], results[label]["total_ms"]))
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        regressions = [
+            "%s: %.1f ms, baseline %.1f ms" % (label, results[label]["total_ms"], before["total_ms"])
+            for label, before in baseline.items()
+            if label in results and results[label]["total_ms"] > max(before["total_ms"] * TOLERANCE,
+                                                                       before["total_ms"] + SLACK_MS)
+        ]
+        if regressions:
+            print("Cold start regressed:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No cold start regression against %s" % args.baseline)
+
+
+if __name__ == "__main__":
+    main()
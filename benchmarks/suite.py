@@ -0,0 +1,412 @@
+"""
+Every API route under load, in-process and over HTTP, with a regression check.
+
+Seeds a database with the requested catalog, users and favorites, then sends the
+same deterministic requests to each route twice: through the Flask test client
+(app cost only) and through a real server driven by several load generator
+processes with keep-alive connections (app + server + network stack). Reports
+requests per second and p50/p95/p99 latency per route.
+
+    python -m benchmarks.suite [--characters N] [--favorites N] [--requests N] ...
+    python -m benchmarks.suite --characters 100000 --favorites 1000000 --save suite.json
+    python -m benchmarks.suite --characters 100000 --favorites 1000000 --baseline suite.json
+
+Uses a scratch SQLite database unless --database-url points at another, which must
+be empty (local Postgres: createdb starwars_bench). Reads run before writes, and
+every write uses its own rows (new users, reserved characters to delete, favorite
+pairs that the matching DELETE removes again), so two runs with the same options
+send the same requests. --save writes the results to a file; --baseline compares
+against such a file and exits with status 1 when a route's p95 is more than
+--tolerance times (and --slack-ms) slower, or its throughput that much lower.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import multiprocessing
+from collections import Counter
+from urllib.parse import quote
+from benchmarks.common import (use_scratch_database, seed_catalog, create_search_index, percentile,
+                               free_port, wait_for, character_row, planet_row, starship_row)
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+PASSWORD = "bench"
+BULK_SIZE = 20
+WARMUP = 10
+TOLERANCE = 1.25
+SLACK_MS = 2.0
+
+SERVERS = {
+    "werkzeug": lambda port, workers: [
+        sys.executable, "-c",
+        "import sys, logging; from werkzeug.serving import run_simple; from app import create_app; "
+        "logging.getLogger('werkzeug').setLevel(logging.WARNING); "
+        "run_simple('127.0.0.1', int(sys.argv[1]), create_app(), threaded=True)", str(port),
+    ],
+    "gunicorn": lambda port, workers: [
+        sys.executable, "-m", "gunicorn", "wsgi", "--chdir", SRC, "--workers", str(workers),
+        "--worker-class", "gthread", "--threads", "8",
+        "--bind", "127.0.0.1:%d" % port, "--log-level", "warning",
+    ],
+}
+
+# filled in by main() before the load generator forks, read by the scenarios
+ctx = {}
+
+
+def spread(k, count):
+    """A deterministic id in 1..count that jumps around instead of walking the table in order."""
+    return (k * 7919) % count + 1
+
+
+def favorite_pair(k, kind):
+    """
+    A (user, entity) pair that seeding did not create: seed_favorites gives user u the
+    window u+1..u+per_kind, POST /favorites/<kind> adds the ids right after it and
+    DELETE /favorites/<kind> removes them again with the same k.
+    """
+    users, count = ctx["users"], ctx[kind]
+    user = k % users + 1
+    return user, (user + ctx["per_kind"][kind] + k // users) % count + 1
+
+
+def bearer(token):
+    return {"Authorization": "Bearer " + token}
+
+
+def get(path):
+    return lambda k: (path, None, {})
+
+
+def post_favorite(kind, column):
+    def make(k):
+        user, entity = favorite_pair(k, kind)
+        return "/favorites/" + kind.rstrip("s"), {"user_id": user, column: entity}, {}
+    return make
+
+
+def batch(k):
+    user = spread(k, ctx["users"])
+    planets = [spread(k + i, ctx["planets"]) for i in range(3)]
+    return "/favorites/%d/batch" % user, {"add": {"planets": planets}, "remove": {"planets": planets}}, {}
+
+
+# (route, method, make(k) -> (path, json body or None, headers), statuses that count as success)
+READS = [
+    ("GET /", "GET", get("/"), (200,)),
+    ("GET /swagger.json", "GET", get("/swagger.json"), (200,)),
+    ("GET /cache/stats", "GET", get("/cache/stats"), (200,)),
+    ("GET /metrics", "GET", get("/metrics"), (200,)),
+    ("GET /db/pool/stats", "GET", get("/db/pool/stats"), (200,)),
+    ("GET /users/<id>", "GET", lambda k: ("/users/%d" % spread(k, ctx["users"]), None, {}), (200,)),
+    ("GET /protected", "GET", lambda k: ("/protected", None, bearer(ctx["token"])), (200,)),
+    ("GET /character", "GET", get("/character?limit=20"), (200,)),
+    ("GET /character/<id>", "GET", lambda k: ("/character/%d" % spread(k, ctx["characters"]), None, {}), (200,)),
+    ("GET /planet", "GET", get("/planet?limit=20"), (200,)),
+    ("GET /planets/<id>", "GET", lambda k: ("/planets/%d" % spread(k, ctx["planets"]), None, {}), (200,)),
+    ("GET /starship", "GET", get("/starship?limit=20"), (200,)),
+    ("GET /starship/<id>", "GET", lambda k: ("/starship/%d" % spread(k, ctx["starships"]), None, {}), (200,)),
+    ("GET /search", "GET", lambda k: ("/search?q=%d" % spread(k, ctx["characters"]), None, {}), (200,)),
+    ("GET /autocomplete", "GET",
+     lambda k: ("/autocomplete?prefix=" + quote("Character %d" % (k % 100)), None, {}), (200,)),
+    ("GET /favorites/<id>", "GET", lambda k: ("/favorites/%d" % spread(k, ctx["users"]), None, {}), (200,)),
+    ("GET /favorites/<id>?expand", "GET",
+     lambda k: ("/favorites/%d?expand=true" % spread(k, ctx["users"]), None, {}), (200,)),
+]
+
+WRITES = [
+    ("POST /users", "POST", lambda k: ("/users", {
+        "username": "bench-new-%d" % k, "mail": "new%d@bench.example" % k, "password": PASSWORD}, {}), (200,)),
+    ("PUT /users/<id>", "PUT",
+     lambda k: ("/users/%d" % spread(k, ctx["users"]), {"username": "bench-renamed-%d" % k}, {}), (200,)),
+    ("POST /token", "POST", lambda k: ("/token", {
+        "mail": "user%d@bench.example" % spread(k, ctx["users"]), "password": PASSWORD}, {}), (200,)),
+    ("DELETE /token", "DELETE", lambda k: ("/token", None, bearer(ctx["tokens"][k])), (200,)),
+    ("POST /character", "POST", lambda k: ("/character", character_row(ctx["characters"] + k), {}), (200,)),
+    ("POST /character/bulk", "POST", lambda k: ("/character/bulk", [
+        character_row(10 ** 7 + k * BULK_SIZE + i) for i in range(BULK_SIZE)], {}), (200,)),
+    ("POST /planet", "POST", lambda k: ("/planet", planet_row(ctx["planets"] + k), {}), (200,)),
+    ("POST /planet/bulk", "POST", lambda k: ("/planet/bulk", [
+        planet_row(10 ** 7 + k * BULK_SIZE + i) for i in range(BULK_SIZE)], {}), (200,)),
+    ("POST /starship", "POST", lambda k: ("/starship", starship_row(ctx["starships"] + k), {}), (200,)),
+    ("POST /starship/bulk", "POST", lambda k: ("/starship/bulk", [
+        starship_row(10 ** 7 + k * BULK_SIZE + i) for i in range(BULK_SIZE)], {}), (200,)),
+    ("POST /favorites/<id>/batch", "POST", batch, (200,)),
+    ("POST /favorites/character", "POST", post_favorite("characters", "character_id"), (200,)),
+    ("POST /favorites/planet", "POST", post_favorite("planets", "planet_id"), (200,)),
+    ("POST /favorites/starship", "POST", post_favorite("starships", "starship_id"), (200,)),
+    ("DELETE /favorites/character", "DELETE",
+     lambda k: ("/favorites/character", dict(zip(("user_id", "character_id"), favorite_pair(k, "characters"))), {}),
+     (200,)),
+    ("DELETE /favorites/planet", "DELETE",
+     lambda k: ("/favorites/planet", dict(zip(("user_id", "planet_id"), favorite_pair(k, "planets"))), {}), (200,)),
+    ("DELETE /favorites/starship", "DELETE",
+     lambda k: ("/favorites/starship", dict(zip(("user_id", "starship_id"), favorite_pair(k, "starships"))), {}),
+     (200,)),
+    # the characters after the seeded catalog are reserved for this one, see seed()
+    ("DELETE /character/<id>", "DELETE",
+     lambda k: ("/character/%d" % (ctx["characters"] + 1 + k), None, {}), (200,)),
+]
+
+SCENARIOS = READS + WRITES
+
+
+# ------------------------------ seeding ------------------------------
+
+def seed_favorites(db, users, favorites, batch_size=5000):
+    """
+    `favorites` rows spread evenly over users and the three kinds: user u gets the
+    entity ids u+1..u+per_kind (wrapping around) of each kind. Returns per_kind.
+    """
+    from models import FAVORITE_KINDS
+
+    per_kind = {}
+    for index, kind in enumerate(FAVORITE_KINDS):
+        count = ctx[kind.name]
+        wanted = favorites // 3 + (1 if index < favorites % 3 else 0)
+        per_kind[kind.name] = min(wanted // users, count)
+        column = kind.entity_id.key
+        rows = []
+        for user in range(1, users + 1):
+            for j in range(per_kind[kind.name]):
+                rows.append({"user_id": user, column: (user + j) % count + 1})
+                if len(rows) == batch_size:
+                    db.session.execute(db.insert(kind.model), rows)
+                    rows = []
+        if rows:
+            db.session.execute(db.insert(kind.model), rows)
+        db.session.commit()
+    return per_kind
+
+
+def seed(app, args):
+    from app import hasher
+    from models import db, User
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        db.create_all()
+        # DELETE /character/<id> needs one existing row per request of each mode
+        seed_catalog(db, characters=args.characters + 2 * args.requests, planets=args.planets,
+                     starships=args.starships)
+        password = hasher.hash(PASSWORD)
+        rows = [{"username": "bench-%d" % i, "mail": "user%d@bench.example" % i, "password": password}
+                for i in range(1, args.users + 1)]
+        db.session.execute(db.insert(User), rows)
+        db.session.commit()
+        ctx["per_kind"] = seed_favorites(db, args.users, args.favorites)
+        create_search_index(db)
+
+        ctx["token"] = create_access_token(identity="1")
+        ctx["tokens"] = [create_access_token(identity=str(spread(k, args.users))) for k in range(2 * args.requests)]
+
+
+# ------------------------------ runners ------------------------------
+
+def summarize(latencies, statuses, expected, elapsed):
+    errors = sum(n for status, n in statuses.items() if status not in expected)
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "errors": errors,
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+    }
+
+
+def run_testclient(app, requests, offset):
+    client = app.test_client()
+    results = {}
+    for route, method, make, expected in SCENARIOS:
+        if method == "GET":
+            for k in range(WARMUP):
+                path, body, headers = make(k)
+                client.get(path, headers=headers)
+        latencies, statuses = [], Counter()
+        started = time.perf_counter()
+        for k in range(offset, offset + requests):
+            path, body, headers = make(k)
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+        results[route] = summarize(latencies, statuses, expected, time.perf_counter() - started)
+        print_row(route, results[route])
+    return results
+
+
+def http_client(port, method, make, ks, out):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    latencies, statuses = [], Counter()
+    started = time.monotonic()
+    for k in ks:
+        path, body, headers = make(k)
+        headers = dict(headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        start = time.monotonic()
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.monotonic() - start)
+        statuses[response.status] += 1
+        if response.will_close:
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.close()
+    out.append((latencies, statuses, started, time.monotonic()))
+
+
+def load_generator(job):
+    """One process: `concurrency` keep-alive clients sharing this process's slice of the requests."""
+    port, index, concurrency, scenario, ks = job
+    route, method, make, expected = SCENARIOS[scenario]
+    out = []
+    threads = [threading.Thread(target=http_client, args=(port, method, make, ks[i::concurrency], out))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return out
+
+
+def run_http(args, offset):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=SRC)
+    server = subprocess.Popen(SERVERS[args.server](port, args.server_workers), cwd=SRC, env=env)
+    # monotonic time is system-wide on Linux, so the processes' start and end times compare
+    pool = multiprocessing.get_context("fork").Pool(args.processes)
+    results = {}
+    try:
+        wait_for(port)
+        for scenario, (route, method, make, expected) in enumerate(SCENARIOS):
+            if method == "GET":
+                pool.map(load_generator, [(port, i, 1, scenario, list(range(WARMUP)))
+                                          for i in range(args.processes)])
+            ks = list(range(offset, offset + args.requests))
+            jobs = [(port, i, args.concurrency, scenario, ks[i::args.processes]) for i in range(args.processes)]
+            parts = [part for out in pool.map(load_generator, jobs) for part in out]
+            latencies = [latency for part in parts for latency in part[0]]
+            statuses = sum((part[1] for part in parts), Counter())
+            elapsed = max(part[3] for part in parts) - min(part[2] for part in parts)
+            results[route] = summarize(latencies, statuses, expected, elapsed)
+            print_row(route, results[route])
+    finally:
+        pool.terminate()
+        server.terminate()
+        server.wait()
+    return results
+
+
+# ------------------------------ report ------------------------------
+
+def print_header(title):
+    print("\n%s" % title)
+    print("%-30s %8s %9s %9s %9s %9s %7s" % ("route", "requests", "req/s", "p50 ms", "p95 ms", "p99 ms", "errors"))
+
+
+def print_row(route, result):
+    print("%-30s %8d %9.1f %9.2f %9.2f %9.2f %7d" % (
+        route, result["requests"], result["rps"], result["p50_ms"], result["p95_ms"], result["p99_ms"],
+        result["errors"]))
+
+
+def regressions(results, baseline, tolerance, slack_ms):
+    found = []
+    for mode, routes in baseline["results"].items():
+        for route, before in routes.items():
+            now = results.get(mode, {}).get(route)
+            if now is None:
+                continue
+            if now["p95_ms"] > max(before["p95_ms"] * tolerance, before["p95_ms"] + slack_ms):
+                found.append("%s %s: p95 %.2f ms, baseline %.2f ms" % (mode, route, now["p95_ms"], before["p95_ms"]))
+            if now["rps"] * tolerance < before["rps"] and before["p95_ms"] > slack_ms:
+                found.append("%s %s: %.1f req/s, baseline %.1f req/s" % (mode, route, now["rps"], before["rps"]))
+            if now["errors"] > before["errors"]:
+                found.append("%s %s: %d errors, baseline %d" % (mode, route, now["errors"], before["errors"]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--characters", type=int, default=10000)
+    parser.add_argument("--planets", type=int, default=1000)
+    parser.add_argument("--starships", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--favorites", type=int, default=100000)
+    parser.add_argument("--database-url", help="an empty database to seed, a scratch SQLite file by default")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route and mode")
+    parser.add_argument("--mode", choices=("testclient", "http", "both"), default="both")
+    parser.add_argument("--server", choices=sorted(SERVERS), default="werkzeug")
+    parser.add_argument("--server-workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--processes", type=int, default=2, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=4, help="connections per load generator process")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--save")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--slack-ms", type=float, default=SLACK_MS)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        use_scratch_database()
+    scratch = tempfile.mkdtemp(prefix="starwars-suite-")
+    os.environ["RESPONSE_CACHE_URL"] = "sqlite:///" + os.path.join(scratch, "cache.db")
+    os.environ["METRICS_DIR"] = os.path.join(scratch, "metrics")
+    os.environ["BCRYPT_LOG_ROUNDS"] = str(args.bcrypt_rounds)
+    # the suite measures throughput, not load shedding (that is login_storm's job)
+    os.environ["PASSWORD_HASH_QUEUE"] = str(args.processes * args.concurrency)
+    os.environ["JWT_REVOCATION"] = "shared"
+    os.environ.pop("FLASK_RUN_FROM_CLI", None)
+    sys.path.insert(0, SRC)
+    from app import create_app
+
+    config = {key: getattr(args, key) for key in ("characters", "planets", "starships", "users", "favorites",
+                                                  "requests", "server", "processes", "concurrency")}
+    config["database"] = os.environ["DATABASE_URL"].split(":", 1)[0]
+    ctx.update(characters=args.characters, planets=args.planets, starships=args.starships, users=args.users)
+
+    app = create_app()
+    started = time.perf_counter()
+    seed(app, args)
+    print("seeded %(characters)d characters, %(planets)d planets, %(starships)d starships, %(users)d users, "
+          "%(favorites)d favorites" % config + " in %.1fs (%s)" % (time.perf_counter() - started, config["database"]))
+
+    results = {}
+    if args.mode in ("testclient", "both"):
+        print_header("Flask test client, 1 thread")
+        results["testclient"] = run_testclient(app, args.requests, 0)
+    if args.mode in ("http", "both"):
+        print_header("HTTP, %s server, %d processes x %d connections" % (args.server, args.processes,
+                                                                          args.concurrency))
+        results["http"] = run_http(args, args.requests)
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump({"config": config, "results": results}, fp, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        if baseline.get("config") != config:
+            print("\nwarning: the baseline was recorded with other options: %s" % baseline.get("config"))
+        found = regressions(results, baseline, args.tolerance, args.slack_ms)
+        if found:
+            print("\nRegressed against %s:\n  %s" % (args.baseline, "\n  ".join(found)))
+            sys.exit(1)
+        print("\nNo regression against %s" % args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# gunicorn reads this file on its own when started from the repository root (Procfile, render.yml).
+
+
+def on_starting(server):
+    # a new master: the counts in METRICS_DIR belong to the previous deploy
+    from metrics import metrics
+    metrics.clear()
@@ -0,0 +1,38 @@
+"""index catalog names for keyset pagination
+
+Revision ID: 1138bf2da17e
+Revises: ad936e8e7a43
+Create Date: 2026-10-17 09:12:40.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1138bf2da17e'
+down_revision = 'ad936e8e7a43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('character', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_character_name'), ['name'], unique=False)
+
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_planet_name'), ['name'], unique=False)
+
+    with op.batch_alter_table('starship', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_starship_name'), ['name'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('starship', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_starship_name'))
+
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_planet_name'))
+
+    with op.batch_alter_table('character', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_character_name'))
@@ -0,0 +1,92 @@
+"""full-text search indexes for the catalog
+
+Revision ID: 25e9b5f068e7
+Revises: 41d90afb0fe0
+Create Date: 2026-10-17 14:05:26.770153
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '25e9b5f068e7'
+down_revision = '41d90afb0fe0'
+branch_labels = None
+depends_on = None
+
+# table -> searchable text columns, keep in sync with search.SEARCH_FIELDS
+SEARCH_COLUMNS = {
+    'character': ('name',),
+    'planet': ('name', 'terrain', 'climate'),
+    'starship': ('name', 'model', 'manufacturer'),
+}
+
+
+def _sqlite_upgrade():
+    # external-content FTS5 tables: the text stays in the catalog tables, triggers keep the index in sync
+    for table, columns in SEARCH_COLUMNS.items():
+        fts = table + '_fts'
+        cols = ', '.join(columns)
+        new_values = ', '.join('new.' + c for c in columns)
+        old_values = ', '.join('old.' + c for c in columns)
+        op.execute(
+            "CREATE VIRTUAL TABLE %s USING fts5(%s, content='%s', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')" % (fts, cols, table)
+        )
+        op.execute(
+            "CREATE TRIGGER %s_ai AFTER INSERT ON %s BEGIN "
+            "INSERT INTO %s(rowid, %s) VALUES (new.id, %s); END" % (fts, table, fts, cols, new_values)
+        )
+        op.execute(
+            "CREATE TRIGGER %s_ad AFTER DELETE ON %s BEGIN "
+            "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.id, %s); END" % (fts, table, fts, fts, cols, old_values)
+        )
+        op.execute(
+            "CREATE TRIGGER %s_au AFTER UPDATE ON %s BEGIN "
+            "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.id, %s); "
+            "INSERT INTO %s(rowid, %s) VALUES (new.id, %s); END"
+            % (fts, table, fts, fts, cols, old_values, fts, cols, new_values)
+        )
+        op.execute("INSERT INTO %s(%s) VALUES ('rebuild')" % (fts, fts))
+
+
+def _sqlite_downgrade():
+    for table in SEARCH_COLUMNS:
+        fts = table + '_fts'
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute('DROP TRIGGER IF EXISTS %s_%s' % (fts, suffix))
+        op.execute('DROP TABLE IF EXISTS %s' % fts)
+
+
+def _postgresql_upgrade():
+    # a generated tsvector column needs no trigger, the GIN index makes @@ an index lookup
+    for table, columns in SEARCH_COLUMNS.items():
+        document = " || ' ' || ".join("coalesce(%s, '')" % c for c in columns)
+        op.execute(
+            "ALTER TABLE %s ADD COLUMN search tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', %s)) STORED" % (table, document)
+        )
+        op.create_index('ix_%s_search' % table, table, ['search'], postgresql_using='gin')
+
+
+def _postgresql_downgrade():
+    for table in SEARCH_COLUMNS:
+        op.drop_index('ix_%s_search' % table, table_name=table)
+        op.drop_column(table, 'search')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _sqlite_upgrade()
+    elif dialect == 'postgresql':
+        _postgresql_upgrade()
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _sqlite_downgrade()
+    elif dialect == 'postgresql':
+        _postgresql_downgrade()
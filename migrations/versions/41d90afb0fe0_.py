@@ -0,0 +1,37 @@
+"""indexes for catalog list filters
+
+Revision ID: 41d90afb0fe0
+Revises: dc244eb6d150
+Create Date: 2026-10-17 13:30:44.012938
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '41d90afb0fe0'
+down_revision = 'dc244eb6d150'
+branch_labels = None
+depends_on = None
+
+# (field, id) so that a filtered, id-ordered page is one index range scan
+FILTER_INDEXES = {
+    'character': ('gender', 'eye_color', 'hair_color'),
+    'planet': ('climate', 'terrain'),
+    'starship': ('starship_class', 'manufacturer', 'model'),
+}
+
+
+def upgrade():
+    for table, fields in FILTER_INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for field in fields:
+                batch_op.create_index('ix_%s_%s_id' % (table, field), [field, 'id'], unique=False)
+
+
+def downgrade():
+    for table, fields in FILTER_INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for field in fields:
+                batch_op.drop_index('ix_%s_%s_id' % (table, field))
@@ -0,0 +1,39 @@
+"""unique (user_id, entity_id) on favorite tables
+
+Revision ID: 5e203ef3fb4c
+Revises: fe084a44dbcd
+Create Date: 2026-10-17 11:20:51.604417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e203ef3fb4c'
+down_revision = 'fe084a44dbcd'
+branch_labels = None
+depends_on = None
+
+FAVORITE_TABLES = (
+    ('favorite_character', 'character_id'),
+    ('favorite_planet', 'planet_id'),
+    ('favorite_starship', 'starship_id'),
+)
+
+
+def upgrade():
+    for table, entity_id in FAVORITE_TABLES:
+        # the API used to accept duplicates, keep the oldest row of each pair
+        op.execute(
+            'DELETE FROM %s WHERE id NOT IN (SELECT keep_id FROM '
+            '(SELECT MIN(id) AS keep_id FROM %s GROUP BY user_id, %s) AS keep)' % (table, table, entity_id)
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index('ix_%s_user_id_%s' % (table, entity_id), ['user_id', entity_id], unique=True)
+
+
+def downgrade():
+    for table, entity_id in FAVORITE_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index('ix_%s_user_id_%s' % (table, entity_id))
@@ -0,0 +1,82 @@
+"""numeric shadow columns for catalog quantities
+
+Revision ID: dc244eb6d150
+Revises: 5e203ef3fb4c
+Create Date: 2026-10-17 12:41:09.377251
+
+"""
+import re
+import math
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dc244eb6d150'
+down_revision = '5e203ef3fb4c'
+branch_labels = None
+depends_on = None
+
+SHADOWS = {
+    'character': ('height', 'mass'),
+    'planet': ('diameter', 'population'),
+    'starship': ('cargo_capacity', 'cost_in_credits', 'crew', 'length', 'passangers'),
+}
+BACKFILL_BATCH = 1000
+
+_NUMBER_RANGE = re.compile(r"(-?\d+(?:\.\d+)?)\s*-\s*(-?\d+(?:\.\d+)?)")
+
+
+def parse_number(text):
+    # frozen copy of models.parse_number, migrations must not depend on the app code
+    if text is None:
+        return None
+    cleaned = str(text).replace(",", "").strip()
+    try:
+        value = float(cleaned)
+    except ValueError:
+        match = _NUMBER_RANGE.fullmatch(cleaned)
+        if match is None:
+            return None
+        value = float(match.group(1))
+    return value if math.isfinite(value) else None
+
+
+def upgrade():
+    for table, fields in SHADOWS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for field in fields:
+                batch_op.add_column(sa.Column(field + '_num', sa.Float(), nullable=True))
+
+    connection = op.get_bind()
+    for table, fields in SHADOWS.items():
+        source = sa.table(table, sa.column('id'), *[sa.column(field) for field in fields])
+        target = sa.table(table, sa.column('id'), *[sa.column(field + '_num') for field in fields])
+        update = target.update().where(target.c.id == sa.bindparam('row_id')).values(
+            {field + '_num': sa.bindparam('v_' + field) for field in fields}
+        )
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                sa.select(source).where(source.c.id > last_id).order_by(source.c.id).limit(BACKFILL_BATCH)
+            ).mappings().all()
+            if not rows:
+                break
+            connection.execute(update, [
+                dict({'row_id': row['id']}, **{'v_' + field: parse_number(row[field]) for field in fields})
+                for row in rows
+            ])
+            last_id = rows[-1]['id']
+
+    for table, fields in SHADOWS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for field in fields:
+                batch_op.create_index(batch_op.f('ix_%s_%s_num' % (table, field)), [field + '_num'], unique=False)
+
+
+def downgrade():
+    for table, fields in SHADOWS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for field in fields:
+                batch_op.drop_index(batch_op.f('ix_%s_%s_num' % (table, field)))
+                batch_op.drop_column(field + '_num')
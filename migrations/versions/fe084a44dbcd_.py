@@ -0,0 +1,34 @@
+"""catalog version counters
+
+Revision ID: fe084a44dbcd
+Revises: 1138bf2da17e
+Create Date: 2026-10-17 10:02:17.530914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fe084a44dbcd'
+down_revision = '1138bf2da17e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    catalog_version = op.create_table('catalog_version',
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.bulk_insert(catalog_version, [
+        {'table_name': 'character', 'version': 1, 'updated_at': None},
+        {'table_name': 'planet', 'version': 1, 'updated_at': None},
+        {'table_name': 'starship', 'version': 1, 'updated_at': None},
+    ])
+
+
+def downgrade():
+    op.drop_table('catalog_version')
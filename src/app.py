@@ -1,65 +1,156 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
+
+The app is built by `create_app(config)`. The admin UI and Flask-Migrate are only
+imported when enabled (ENABLE_ADMIN / ENABLE_MIGRATE, both on by default when
+running through the `flask` command, off under gunicorn) and the swagger spec is
+built on the first request to /swagger.json, so a worker boot does not pay for them.
 """
 import os
-from flask import Flask, request, jsonify, url_for
+from flask import Flask, Blueprint, Response, request, jsonify, url_for, current_app, send_from_directory
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import  JWTManager, create_access_token, jwt_required, get_jwt_identity
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from flask_jwt_extended import  JWTManager, create_access_token, jwt_required, get_jwt, get_current_user
 from flask_cors import CORS
 from utils import APIException, generate_sitemap
-from admin import setup_admin
+from pagination import KeysetPage
+from filters import sort_columns, catalog_filters, sparse_serializer
+from versioning import conditional, bump_version
+from cache import response_cache
+from compression import compressor
+from db_pool import engine_options, pool_metrics
+from metrics import metrics
+from json_provider import provider_class
+from query_inspector import query_inspector
+from profiler import profiler, profile_cli
+from catalog_loader import catalog_cli
+from search import search_view
+from autocomplete import autocomplete_index, KINDS as AUTOCOMPLETE_KINDS
+from bulk import request_records, bulk_insert, batch_size_arg
+from hashing import PasswordHasher, PasswordHasherBusy
+from identity import setup_identity, identity_cache, revoked_tokens
+from favorites import (
+    KIND_BY_ENTITY,
+    load_favorites,
+    expand_favorites,
+    add_favorite,
+    remove_favorite,
+    parse_favorite_changes,
+    apply_favorite_changes,
+)
 from models import (
     db,
     User,
     Character,
     Planet,
     Starship,
-    Favorite_character,
-    Favorite_planet,
-    Favorite_starship,
+    serializer_for,
 )
 
-# from models import Person
-app = Flask(__name__)
-app.url_map.strict_slashes = False
+api = Blueprint("api", __name__)
 
+# ENCRIPTACION JWT-------
 
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config["SQLALCHEMY_DATABASE_URI"] = db_url.replace(
-        "postgres://", "postgresql://"
-    )
-else:
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:////tmp/test.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+jwt = JWTManager()     # instanciamos jwt de JWTManager, create_app lo enlaza con la app para tener las herramientas de encriptacion.
+setup_identity(jwt)    # usuario del token desde una cache en memoria, sin consulta por peticion
+bcrypt = Bcrypt()      # para encriptar password
+hasher = PasswordHasher(bcrypt)  # bcrypt fuera del hilo de la peticion, con cola limitada
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def default_config():
+    db_url = os.getenv("DATABASE_URL")
+    from_cli = os.getenv("FLASK_RUN_FROM_CLI") == "true"
+    return {
+        "SQLALCHEMY_DATABASE_URI": db_url.replace("postgres://", "postgresql://") if db_url else "sqlite:////tmp/test.db",
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        "JWT_SECRET_KEY": "valor-variable",  # clave secreta para firmar los tokens, cuanto mas largo mejor.
+        "BCRYPT_LOG_ROUNDS": int(os.getenv("BCRYPT_LOG_ROUNDS", 12)),  # coste de bcrypt, los hashes viejos se actualizan al hacer login
+        "ENABLE_ADMIN": _env_flag("ENABLE_ADMIN", from_cli),
+        "ENABLE_MIGRATE": _env_flag("ENABLE_MIGRATE", from_cli),
+    }
 
-MIGRATE = Migrate(app, db)
-CORS(app, redirect=False)
-db.init_app(app)
-setup_admin(app)
 
-# ENCRIPTACION JWT-------
+def create_app(config=None):
+    """Builds the API app. `config` overrides the settings read from the environment."""
+    app = Flask(__name__)
+    app.json = provider_class()(app)  # orjson si esta instalado, ver json_provider.py
+    app.url_map.strict_slashes = False
+    app.config.update(default_config())
+    app.config.update(config or {})
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"]))
+
+    CORS(app, redirect=False)
+    db.init_app(app)
+    with app.app_context():
+        pool_metrics.attach(db.engine)
+        metrics.attach(db.engine)
+        query_inspector.attach(db.engine)
+    metrics.init_app(app)
+    query_inspector.init_app(app)
+    profiler.init_app(app)
+    compressor.init_app(app)
+    jwt.init_app(app)
+    bcrypt.init_app(app)
+    app.register_blueprint(api)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(profile_cli)
+
+    if app.config["ENABLE_MIGRATE"]:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    if app.config["ENABLE_ADMIN"]:
+        from admin import setup_admin
+        setup_admin(app)
+    return app
 
-app.config["JWT_SECRET_KEY"] = "valor-variable"  # clave secreta para firmar los tokens, cuanto mas largo mejor.
-jwt = JWTManager(app)  # isntanciamos jwt de JWTManager utilizando app para tener las herramientas de encriptacion.
-bcrypt = Bcrypt(app)   # para encriptar password
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
-    return jsonify(error.to_dict()), error.status_code
+    return jsonify(error.to_dict()), error.status_code, getattr(error, "headers", None)
 
 
 # generate sitemap with all your endpoints
-@app.route("/")
+@api.route("/")
 def sitemap():
-    return generate_sitemap(app)
+    return generate_sitemap(current_app)
+
+@api.route("/swagger.json", methods=["GET"])
+def get_swagger_spec():
+    from flask_swagger import swagger
+    return jsonify(swagger(current_app))
+
+@api.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+@api.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@api.route("/db/pool/stats", methods=["GET"])
+def get_pool_stats():
+    return jsonify(pool_metrics.stats())
+
+@api.route("/profiles", methods=["GET"])
+def list_profiles():
+    profiler.require_token()
+    return jsonify(profiler.files())
+
+@api.route("/profiles/<path:filename>", methods=["GET"])
+def download_profile(filename):
+    profiler.require_token()
+    return send_from_directory(profiler.directory, filename, as_attachment=True, mimetype="text/plain")
 
 # ------------------------------ POST USER, UPDATE USER, GET USER, OBTAIN TOKEN, TOKEN VALIDATION ------------------------------
 
-@app.route("/users", methods=["POST"])
+@api.route("/users", methods=["POST"])
 def create_user():
     try:
 
@@ -78,7 +169,7 @@ def create_user():
         if existing_mail:
             return jsonify({'error': 'Mail already exist.'}), 409
         
-        db_passowrd = bcrypt.generate_password_hash(password).decode('utf-8')
+        db_passowrd = hasher.hash(password)
         new_user = User(username = username, mail = mail, password= db_passowrd)
         db.session.add(new_user)
         db.session.commit()
@@ -91,22 +182,25 @@ def create_user():
 
         return jsonify({"User created successfully": response_body}), 200
     
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         return jsonify({'error': 'Error in user creation: ' + str(e)}), 500
     
-@app.route("/users/<int:user_id>", methods=["PUT"])
+@api.route("/users/<int:user_id>", methods=["PUT"])
 def update_user(user_id):
 
     new_username = request.json.get("username")
     user = User.query.get(user_id)
     user.username = new_username
     db.session.commit()
+    identity_cache.invalidate(user_id)
 
     new_data = {"username": user.username, "mail": user.mail, "password": user.password}
 
     return jsonify("Updated user", new_data)
 
-@app.route("/users/<int:user_id>", methods=["GET"])
+@api.route("/users/<int:user_id>", methods=["GET"])
 def get_user(user_id):
 
     user = User.query.get(user_id)
@@ -121,7 +215,7 @@ def get_user(user_id):
         }
         return jsonify('User data:', user_data)
 
-@app.route('/token', methods=['POST'])
+@api.route('/token', methods=['POST'])
 def get_token():
 
     try:
@@ -133,26 +227,44 @@ def get_token():
         
         login_user = User.query.filter_by(mail=mail).one()
         db_password = login_user.password
-        true_or_false = bcrypt.check_password_hash(db_password, password)
+        true_or_false = hasher.check(db_password, password)
 
         if true_or_false:
+            if hasher.needs_rehash(db_password):
+                # BCRYPT_LOG_ROUNDS changed since this hash was made, we have the password now
+                try:
+                    login_user.password = hasher.hash(password)
+                    db.session.commit()
+                except PasswordHasherBusy:
+                    pass  # next login will try again
             user_id = login_user.id
-            access_token = create_access_token(identity=user_id)
+            access_token = create_access_token(identity=str(user_id))
             return jsonify({'token': access_token, 'user_id': user_id}), 200
 
         else:
             return jsonify({"error": "Wrong password"})
     
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         return jsonify({'error': 'Wrong mail: ' + str(e)}), 500
 
 
-@app.route("/protected", methods=["GET"])
+@api.route('/token', methods=['DELETE'])
+@jwt_required()
+def revoke_token():
+    if revoked_tokens is None:
+        raise APIException("Token revocation is disabled, set JWT_REVOCATION=shared", status_code=501)
+    token = get_jwt()
+    revoked_tokens.revoke(token["jti"], token["exp"])
+    return jsonify({"revoked": True}), 200
+
+
+@api.route("/protected", methods=["GET"])
 @jwt_required()
 def protected():
-    # Accede a la identidad del usuario actual con get_jwt_identity
-    current_user_id = get_jwt_identity()
-    user = User.filter.get(current_user_id)
+    # El usuario del token lo resuelve el user loader de identity.py (cacheado, sin consulta)
+    user = get_current_user()
     if user:
         return jsonify(True), 200
     else:
@@ -161,55 +273,51 @@ def protected():
 
 # ------------------------------ POST, GET, GET BY ID, DELETE ---> CHARACTERS ------------------------------
 
-@app.route("/character", methods=["POST"])
+@api.route("/character", methods=["POST"])
 def post_character():
 
     try: 
-        name = request.json.get('name'),
-        birth_year = request.json.get('birth_year'),
-        eye_color = request.json.get('eye_color'),
-        hair_color = request.json.get('hair_color'),
-        skin_color = request.json.get('skin_color'),
-        gender = request.json.get('gender'),
-        height = request.json.get('height'),
-        mass = request.json.get('mass'),
-
-        new_character = Character(
-            name = name,
-            birth_year = birth_year,
-            eye_color = eye_color,
-            hair_color = hair_color,
-            skin_color = skin_color,
-            gender = gender,
-            height = height,
-            mass= mass
-        )
-        db.session.add(new_character)
+        serializer = serializer_for(Character)
+        response_body = serializer.create(serializer.load(request.json))
+        version = bump_version(Character)
         db.session.commit()
-
-        response_body = {
-            "name": new_character.name,
-            "birth_year": new_character.birth_year,
-            "eye_color": new_character.eye_color,
-            "hair_color": new_character.hair_color,
-            "skin_color": new_character.skin_color,
-            "gender": new_character.gender,
-            "height": new_character.height,
-            "mass": new_character.mass,
-        }
+        response_cache.invalidate(Character)
+        autocomplete_index.add(Character, response_body['id'], response_body['name'], version)
 
         return jsonify('Character added', response_body)
     
     except Exception as e:
         return jsonify({'error': 'Error adding character: ' + str(e)}), 500
+
+@api.route("/character/bulk", methods=["POST"])
+def post_character_bulk():
+
+    records = request_records()
+    batch_size = batch_size_arg()
+    try:
+        inserted, errors = bulk_insert(Character, records, batch_size)
+        if inserted:
+            version = bump_version(Character)
+        db.session.commit()
+        if inserted:
+            response_cache.invalidate(Character)
+            autocomplete_index.invalidate(Character)
+
+        return jsonify({'inserted': inserted, 'errors': errors})
+
+    except Exception as e:
+        return jsonify({'error': 'Error adding characters: ' + str(e)}), 500
     
-@app.route("/character/<int:character_id>", methods=["DELETE"])
+@api.route("/character/<int:character_id>", methods=["DELETE"])
 def delete_character(character_id):
 
     try: 
         character = Character.query.get(character_id)
         db.session.delete(character)
+        version = bump_version(Character)
         db.session.commit()
+        response_cache.invalidate(Character)
+        autocomplete_index.remove(Character, character_id, version)
 
         return jsonify('Character deleted')
     
@@ -218,363 +326,279 @@ def delete_character(character_id):
 
     
 
-@app.route("/character", methods=["GET"])
+@api.route("/character", methods=["GET"])
+@conditional(Character)
+@response_cache.cached(Character)
 def get_all_character():
 
-    characters = Character.query.all()
-
-    character_list = []
-    for char in characters:
-        character_dict = {
-            "id": char.id,
-            "name": char.name,
-            "birth_year": char.birth_year,
-            "eye_color": char.eye_color,
-            "hair_color": char.hair_color,
-            "skin_color": char.skin_color,
-            "gender": char.gender,
-            "height": char.height,
-            "mass": char.mass,
-        }
-        character_list.append(character_dict)
+    serializer = sparse_serializer(Character, request.args)
+    page = KeysetPage(Character, sortable=sort_columns(Character))
+    stmt = serializer.select().where(*catalog_filters(Character, request.args))
+    characters = page.finish(db.session.execute(page.apply(stmt)))
 
-    return jsonify(character_list)
+    return page.respond(serializer.rows(characters))
 
 
-@app.route("/character/<int:character_id>", methods=["GET"])
+@api.route("/character/<int:character_id>", methods=["GET"])
+@conditional(Character)
+@response_cache.cached(Character)
 def get_character_by_id(character_id):
-    character = Character.query.get(character_id)
+    character = sparse_serializer(Character, request.args).get(character_id)
 
     if not character:
         return jsonify({"error": "No character finded"}), 404
-    
-    character_list = {
-            "id": character.id,
-            "name": character.name,
-            "birth_year": character.birth_year,
-            "eye_color": character.eye_color,
-            "hair_color": character.hair_color,
-            "skin_color": character.skin_color,
-            "gender": character.gender,
-            "height": character.height,
-            "mass": character.mass,
-            "homeworld": character.homeworld,
-        }
 
-    return jsonify('Your character is:', character_list)
+    return jsonify('Your character is:', character)
 
 # ------------------------------ POST, GET, GET BY ID, DELETE ---> PLANETS ------------------------------
 
-@app.route("/planet", methods=["POST"])
+@api.route("/planet", methods=["POST"])
 def post_planet():
     try:
-        name = request.json.get('name')
-        climate = request.json.get('climate')
-        diameter = request.json.get('diameter')
-        gravity = request.json.get('gravity')
-        orbital_period = request.json.get('orbital_period')
-        population = request.json.get('population')
-        rotation_period = request.json.get('rotation_period')
-        surface_water = request.json.get('surface_water')
-        terrain = request.json.get('terrain')
-
-        new_planet = Planet(
-            name=name,
-            climate=climate,
-            diameter=diameter,
-            gravity=gravity,
-            orbital_period=orbital_period,
-            population=population,
-            rotation_period=rotation_period,
-            surface_water=surface_water,
-            terrain=terrain
-        )
-        db.session.add(new_planet)
+        serializer = serializer_for(Planet)
+        response_body = serializer.create(serializer.load(request.json))
+        version = bump_version(Planet)
         db.session.commit()
-
-        response_body = {
-            "name": new_planet.name,
-            "climate": new_planet.climate,
-            "diameter": new_planet.diameter,
-            "gravity": new_planet.gravity,
-            "orbital_period": new_planet.orbital_period,
-            "population": new_planet.population,
-            "rotation_period": new_planet.rotation_period,
-            "surface_water": new_planet.surface_water,
-            "terrain": new_planet.terrain
-        }
+        response_cache.invalidate(Planet)
+        autocomplete_index.add(Planet, response_body['id'], response_body['name'], version)
 
         return jsonify('Planet added', response_body)
 
     except Exception as e:
         return jsonify({'error': 'Error adding planet: ' + str(e)}), 500
 
-@app.route("/planet", methods=["GET"])
+@api.route("/planet/bulk", methods=["POST"])
+def post_planet_bulk():
+
+    records = request_records()
+    batch_size = batch_size_arg()
+    try:
+        inserted, errors = bulk_insert(Planet, records, batch_size)
+        if inserted:
+            version = bump_version(Planet)
+        db.session.commit()
+        if inserted:
+            response_cache.invalidate(Planet)
+            autocomplete_index.invalidate(Planet)
+
+        return jsonify({'inserted': inserted, 'errors': errors})
+
+    except Exception as e:
+        return jsonify({'error': 'Error adding planets: ' + str(e)}), 500
+
+@api.route("/planet", methods=["GET"])
+@conditional(Planet)
+@response_cache.cached(Planet)
 def get_all_planets():
 
-    planets = Planet.query.all()
-
-    planet_list = []
-    for planet in planets:
-        planet_dict = {
-            'id': planet.id,
-            'name': planet.name,
-            'climate': planet.climate,
-            'diameter': planet.diameter,
-            'gravity': planet.gravity,
-            'orbital_period': planet.orbital_period,
-            'population': planet.population,
-            'rotation_period': planet.rotation_period,
-            'surface_water': planet.surface_water,
-            'terrain': planet.terrain
-        }
-        planet_list.append(planet_dict)
+    serializer = sparse_serializer(Planet, request.args)
+    page = KeysetPage(Planet, sortable=sort_columns(Planet))
+    stmt = serializer.select().where(*catalog_filters(Planet, request.args))
+    planets = page.finish(db.session.execute(page.apply(stmt)))
 
-    return jsonify(planet_list)
+    return page.respond(serializer.rows(planets))
 
 
-@app.route("/planets/<int:planet_id>", methods=["GET"])
+@api.route("/planets/<int:planet_id>", methods=["GET"])
+@conditional(Planet)
+@response_cache.cached(Planet)
 def get_planet_by_id(planet_id):
 
-    planet = Planet.query.get(planet_id)
+    planet = sparse_serializer(Planet, request.args).get(planet_id)
 
     if not planet:
         return jsonify({"error": "No planet finded"}), 404
 
-    planet_list = {
-            'id': planet.id,
-            'name': planet.name,
-            'climate': planet.climate,
-            'diameter': planet.diameter,
-            'gravity': planet.gravity,
-            'orbital_period': planet.orbital_period,
-            'population': planet.population,
-            'rotation_period': planet.rotation_period,
-            'surface_water': planet.surface_water,
-            'terrain': planet.terrain
-        }
-
-    return jsonify(planet_list)
+    return jsonify(planet)
 
 # ------------------------------ POST, GET, GET BY ID, DELETE ---> STARSHIPS ------------------------------
 
-@app.route("/starship", methods=["POST"])
+@api.route("/starship", methods=["POST"])
 def post_starship():
     try:
-        name = request.json.get('name')
-        model = request.json.get('model')
-        MGLT = request.json.get('MGLT')
-        cargo_capacity = request.json.get('cargo_capacity')
-        consumable = request.json.get('consumable')
-        cost_in_credits = request.json.get('cost_in_credits')
-        crew = request.json.get('crew')
-        hyperdrive_rating = request.json.get('hyperdrive_rating')
-        length = request.json.get('length')
-        manufacturer = request.json.get('manufacturer')
-        passangers = ('passangers')
-        starship_class = ('starship_class')
-
-        new_starship = Starship(
-            name=name,
-            model=model,
-            MGLT=MGLT,
-            cargo_capacity=cargo_capacity,
-            consumable=consumable,
-            cost_in_credits=cost_in_credits,
-            crew=crew,
-            hyperdrive_rating=hyperdrive_rating,
-            length=length,
-            manufacturer=manufacturer,
-            passangers = passangers,
-            starship_class = starship_class
-        )
-        db.session.add(new_starship)
+        serializer = serializer_for(Starship)
+        response_body = serializer.create(serializer.load(request.json))
+        version = bump_version(Starship)
         db.session.commit()
-
-        response_body = {
-            "id": new_starship.id,
-            "name": new_starship.name,
-            "model": new_starship.model,
-            "MGLT": new_starship.MGLT,
-            "cargo_capacity": new_starship.cargo_capacity,
-            "consumable": new_starship.consumable,
-            "cost_in_credits": new_starship.cost_in_credits,
-            "crew": new_starship.crew,
-            "hyperdrive_rating": new_starship.hyperdrive_rating,
-            "length": new_starship.length,
-            "manufacturer": new_starship.manufacturer,
-            "passangers": new_starship.passangers,
-            "starship_class": new_starship.starship_class
-        }
+        response_cache.invalidate(Starship)
+        autocomplete_index.add(Starship, response_body['id'], response_body['name'], version)
 
         return jsonify('Starship added', response_body)
 
     except Exception as e:
         return jsonify({'error': 'Error adding starship: ' + str(e)}), 500
 
+@api.route("/starship/bulk", methods=["POST"])
+def post_starship_bulk():
 
-@app.route("/starship", methods=["GET"])
+    records = request_records()
+    batch_size = batch_size_arg()
+    try:
+        inserted, errors = bulk_insert(Starship, records, batch_size)
+        if inserted:
+            version = bump_version(Starship)
+        db.session.commit()
+        if inserted:
+            response_cache.invalidate(Starship)
+            autocomplete_index.invalidate(Starship)
+
+        return jsonify({'inserted': inserted, 'errors': errors})
+
+    except Exception as e:
+        return jsonify({'error': 'Error adding starships: ' + str(e)}), 500
+
+
+@api.route("/starship", methods=["GET"])
+@conditional(Starship)
+@response_cache.cached(Starship)
 def get_all_ships():
-    ships = Starship.query.all()
-
-    ship_list = []
-    for ship in ships:
-        ship_dict = {
-            'id': ship.id,
-            'name': ship.name,
-            'model': ship.model,
-            'MGLT': ship.MGLT,
-            'cargo_capacity': ship.cargo_capacity,
-            'consumable': ship.consumable,
-            'cost_in_credits': ship.cost_in_credits,
-            'crew': ship.crew,
-            'hyperdrive_rating': ship.hyperdrive_rating,
-            'length': ship.length,
-            'manufacturer': ship.manufacturer,
-            "passangers": ship.passangers,
-            "starship_class": ship.starship_class
-        }
-        ship_list.append(ship_dict)
 
-    return jsonify(ship_list)
+    serializer = sparse_serializer(Starship, request.args)
+    page = KeysetPage(Starship, sortable=sort_columns(Starship))
+    stmt = serializer.select().where(*catalog_filters(Starship, request.args))
+    ships = page.finish(db.session.execute(page.apply(stmt)))
 
+    return page.respond(serializer.rows(ships))
 
-@app.route("/starship/<int:ship_id>", methods=["GET"])
+
+@api.route("/starship/<int:ship_id>", methods=["GET"])
+@conditional(Starship)
+@response_cache.cached(Starship)
 def get_ship_by_id(ship_id):
-    ship = Starship.query.get(ship_id)
+    ship = sparse_serializer(Starship, request.args).get(ship_id)
 
     if not ship:
         return jsonify({"error": "No StarShip finded"}), 404
-    
-    ship_list = {
-            'id': ship.id,
-            'name': ship.name,
-            'model': ship.model,
-            'MGLT': ship.MGLT,
-            'cargo_capacity': ship.cargo_capacity,
-            'consumable': ship.consumable,
-            'cost_in_credits': ship.cost_in_credits,
-            'crew': ship.crew,
-            'hyperdrive_rating': ship.hyperdrive_rating,
-            'length': ship.length,
-            'manufacturer': ship.manufacturer,
-            "passangers": ship.passangers,
-            "starship_class": ship.starship_class
-        }
 
-    return jsonify(ship_list)
+    return jsonify(ship)
+
+# ------------------------------ SEARCH ---> CHARACTERS, PLANETS, STARSHIPS ------------------------------
+
+@api.route("/search", methods=["GET"])
+def search_catalog():
+    return search_view()
+
+@api.route("/autocomplete", methods=["GET"])
+def autocomplete():
+
+    prefix = request.args.get('prefix', '').strip()
+    if not prefix:
+        return jsonify({'error': 'prefix is required'}), 400
+
+    kinds = [k for arg in request.args.getlist('kind') for k in arg.split(',') if k] or None
+    if kinds and not set(kinds) <= set(AUTOCOMPLETE_KINDS):
+        return jsonify({'error': 'kind must be character, planet or starship'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    return jsonify(autocomplete_index.search(prefix, kinds, limit))
 
 # ------------------------------ POST, GET, DELETE ---> FAVORITES ------------------------------
 
 
-@app.route("/favorites/<int:user_id>", methods=["GET"])
+@api.route("/favorites/<int:user_id>", methods=["GET"])
 def get_user_favorites(user_id):
 
-    favorite_characters = db.session.query(Favorite_character).filter_by(user_id=user_id).all()    
-    favorite_character_ids = [fav.character_id for fav in favorite_characters]    
-    favorite_planets = db.session.query(Favorite_planet).filter_by(user_id=user_id).all()    
-    favorite_planets_ids = [fav.planet_id for fav in favorite_planets]   
-    favorite_ships = db.session.query(Favorite_starship).filter_by(user_id=user_id).all()    
-    favorite_ships_ids = [fav.starship_id for fav in favorite_ships]   
-
-    favorites = {
-        "characters": favorite_character_ids,
-        "planets": favorite_planets_ids,
-        "starships": favorite_ships_ids,
-    }
+    favorites = load_favorites(user_id)
+    if request.args.get("expand", "").lower() in ("1", "true", "yes"):
+        favorites = expand_favorites(favorites)
 
     return jsonify(favorites)
 
-@app.route('/favorites/character', methods=['POST'])
+@api.route("/favorites/<int:user_id>/batch", methods=["POST"])
+def post_favorites_batch(user_id):
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be a JSON object with "add" and/or "remove".'}), 400
+    try:
+        adds = parse_favorite_changes(data.get('add'))
+        removes = parse_favorite_changes(data.get('remove'))
+    except ValueError as e:
+        return jsonify({'error': 'Invalid favorites batch: ' + str(e)}), 400
+
+    try:
+        added, removed = apply_favorite_changes(user_id, adds, removes)
+        db.session.commit()
+
+        return jsonify({'added': added, 'removed': removed, 'favorites': load_favorites(user_id)})
+
+    except Exception as e:
+        return jsonify({'error': 'Error updating favorites: ' + str(e)}), 500
+
+@api.route('/favorites/character', methods=['POST'])
 def post_favorite_character():
 
     data = request.json
-    favorite = Favorite_character(character_id = data['character_id'], user_id = data['user_id'])
-    db.session.add(favorite)
+    add_favorite(KIND_BY_ENTITY['character'], data['user_id'], data['character_id'])
     db.session.commit()
 
     return jsonify('Favorite character added')
 
-@app.route('/favorites/planet', methods=['POST'])
+@api.route('/favorites/planet', methods=['POST'])
 def post_favorite_planet():
 
     data = request.json
-    favorite = Favorite_planet(planet_id = data['planet_id'], user_id = data['user_id'])
-    db.session.add(favorite)
+    add_favorite(KIND_BY_ENTITY['planet'], data['user_id'], data['planet_id'])
     db.session.commit()
 
     return jsonify('Favorite planet added')
 
-@app.route('/favorites/starship', methods=['POST'])
+@api.route('/favorites/starship', methods=['POST'])
 def post_favorite_ship():
 
     data = request.json
-
-    favorite = Favorite_starship(starship_id=data['starship_id'], user_id=data['user_id'])
-    db.session.add(favorite)
+    add_favorite(KIND_BY_ENTITY['starship'], data['user_id'], data['starship_id'])
     db.session.commit()
 
     return ('Favorite starship added')
 
-@app.route('/favorites/character', methods=['DELETE'])
+@api.route('/favorites/character', methods=['DELETE'])
 def delete_favorite_character():
     try:
 
         user_id = request.json.get('user_id')
         character_id = request.json.get('character_id')
-        user = User.query.get(user_id)
-        if user:
-            favorite = Favorite_character.query.filter_by(character_id=character_id, user_id=user_id).first()
-            if favorite:
-                db.session.delete(favorite)
-                db.session.commit()
-                return jsonify({'message': 'Favorite character deleted successfully'}), 200
-            else:
-                return jsonify({'error': 'Favorite character not found for this user'}), 404
+        deleted = remove_favorite(KIND_BY_ENTITY['character'], user_id, character_id)
+        db.session.commit()
+        if deleted:
+            return jsonify({'message': 'Favorite character deleted successfully', 'deleted': deleted}), 200
         else:
-            return jsonify({'error': 'User not found'}), 404
+            return jsonify({'error': 'Favorite character not found for this user'}), 404
 
     except Exception as e:
         return jsonify({'error': 'Error deleting favorite character: ' + str(e)}), 500
 
-@app.route('/favorites/planet', methods=['DELETE'])
+@api.route('/favorites/planet', methods=['DELETE'])
 def delete_favorite_planet():
     try:
 
         user_id = request.json.get('user_id')
         planet_id = request.json.get('planet_id')
-        user = User.query.get(user_id)
-        if user:
-            favorite = Favorite_planet.query.filter_by(planet_id=planet_id, user_id=user_id).first()
-            if favorite:
-                db.session.delete(favorite)
-                db.session.commit()
-                return jsonify({'message': 'Favorite planet deleted successfully'}), 200
-            else:
-                return jsonify({'error': 'Favorite planet not found for this user'}), 404
+        deleted = remove_favorite(KIND_BY_ENTITY['planet'], user_id, planet_id)
+        db.session.commit()
+        if deleted:
+            return jsonify({'message': 'Favorite planet deleted successfully', 'deleted': deleted}), 200
         else:
-            return jsonify({'error': 'User not found'}), 404
+            return jsonify({'error': 'Favorite planet not found for this user'}), 404
 
     except Exception as e:
         return jsonify({'error': 'Error deleting favorite planet: ' + str(e)}), 500
 
-@app.route('/favorites/starship', methods=['DELETE'])
+@api.route('/favorites/starship', methods=['DELETE'])
 def delete_favorite_ship():
     try:
 
         user_id = request.json.get('user_id')
         starship_id = request.json.get('starship_id')
-        user = User.query.get(user_id)
-        if user:
-            favorite = Favorite_starship.query.filter_by(starship_id=starship_id, user_id=user_id).first()
-            if favorite:
-                db.session.delete(favorite)
-                db.session.commit()
-                return jsonify({'message': 'Favorite starship deleted successfully'}), 200
-            else:
-                return jsonify({'error': 'Favorite starship not found for this user'}), 404
+        deleted = remove_favorite(KIND_BY_ENTITY['starship'], user_id, starship_id)
+        db.session.commit()
+        if deleted:
+            return jsonify({'message': 'Favorite starship deleted successfully', 'deleted': deleted}), 200
         else:
-            return jsonify({'error': 'User not found'}), 404
+            return jsonify({'error': 'Favorite starship not found for this user'}), 404
 
     except Exception as e:
         return jsonify({'error': 'Error deleting favorite starship: ' + str(e)}), 500
@@ -582,4 +606,4 @@ def delete_favorite_ship():
 # this only runs if `$ python src/app.py` is executed
 if __name__ == "__main__":
     PORT = int(os.environ.get("PORT", 3000))
-    app.run(host="0.0.0.0", port=PORT, debug=False)
+    create_app().run(host="0.0.0.0", port=PORT, debug=False)
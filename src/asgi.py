@@ -0,0 +1,297 @@
+"""
+ASGI entry point, the optional async counterpart of wsgi.py:
+
+    uvicorn asgi:app --app-dir src --host 0.0.0.0 --port $PORT
+
+The catalog reads (list and by-id of characters, planets and starships) and
+GET /favorites/<user_id> run here on SQLAlchemy's asyncio engine, so a worker keeps
+serving other requests while one waits on the database. They are matched with the
+Flask URL map and answered inside a Flask request context, so arguments, cursors,
+ETags, before/after_request hooks and error handlers behave exactly as in the sync
+views. Async reads skip the shared response cache, its backends are blocking.
+
+Every other route runs the unchanged Flask app on a thread pool
+(ASGI_WSGI_THREADS). Request and response bodies are buffered on that path.
+
+Needs uvicorn (or any ASGI server) and the async driver of the database:
+aiosqlite for SQLite, asyncpg for Postgres, aiomysql for MySQL. ASYNC_DATABASE_URL
+overrides the URL derived from DATABASE_URL. Without a usable async driver every
+route goes through the Flask app.
+"""
+import io
+import os
+import sys
+import asyncio
+import logging
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from flask import Response, g, jsonify, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+from sqlalchemy.engine import make_url
+from app import create_app
+from autocomplete import autocomplete_index
+from db_pool import engine_options
+from metrics import metrics
+from query_inspector import query_inspector
+from favorites import favorites_select, group_favorites, expanded_select, order_expanded
+from filters import sort_columns, catalog_filters, sparse_serializer
+from models import db, Character, Planet, Starship, FAVORITE_KINDS
+from pagination import KeysetPage
+from versioning import version_select, version_from_row, make_etag, is_not_modified, set_validators
+
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 8))
+
+flask_app = create_app()
+
+# backend -> async driver, and the module that has to be importable for it
+ASYNC_DRIVERS = {
+    "sqlite": ("sqlite+aiosqlite", "aiosqlite"),
+    "postgresql": ("postgresql+asyncpg", "asyncpg"),
+    "mysql": ("mysql+aiomysql", "aiomysql"),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def async_database_url():
+    """The async URL of the app's database, None when its driver is not installed."""
+    if os.getenv("ASYNC_DATABASE_URL"):
+        return make_url(os.getenv("ASYNC_DATABASE_URL"))
+    with flask_app.app_context():
+        url = db.engine.url  # flask-sqlalchemy already resolved relative SQLite paths
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        logger.warning("asgi: no async driver for %s, every route runs on the Flask app", url.get_backend_name())
+        return None
+    try:
+        importlib.import_module(driver[1])
+    except ImportError:
+        logger.warning("asgi: %s is not installed, every route runs on the Flask app", driver[1])
+        return None
+    return url.set(drivername=driver[0])
+
+
+def create_engine(url):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    options = engine_options(url.set(drivername=url.get_backend_name()).render_as_string(hide_password=False))
+    options.pop("poolclass", None)
+    connect_args = options.pop("connect_args", {})
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+    if statement_timeout and url.get_backend_name() == "postgresql":
+        connect_args = {"server_settings": {"statement_timeout": str(statement_timeout)}}
+    engine = create_async_engine(url, connect_args=connect_args, **options)
+    metrics.attach(engine.sync_engine)
+    query_inspector.attach(engine.sync_engine)
+    return engine
+
+
+# ------------------------------ async views ------------------------------
+
+async def _version(conn, model):
+    """Same as @conditional: (etag, last_modified, 304 response or None)."""
+    version, last_modified = version_from_row((await conn.execute(version_select(model))).first())
+    etag = make_etag(model, version)
+    g.catalog_version = version
+    g.catalog_modified = last_modified
+    if is_not_modified(etag, last_modified):
+        return etag, last_modified, set_validators(Response(status=304), etag, last_modified)
+    return etag, last_modified, None
+
+
+async def catalog_list(conn, model):
+    etag, last_modified, not_modified = await _version(conn, model)
+    if not_modified is not None:
+        return not_modified
+
+    serializer = sparse_serializer(model, request.args)
+    page = KeysetPage(model, sortable=sort_columns(model))
+    stmt = serializer.select().where(*catalog_filters(model, request.args))
+    rows = page.finish(await conn.execute(page.apply(stmt)))
+    return set_validators(page.respond(serializer.rows(rows)), etag, last_modified)
+
+
+def _by_id(model, missing, wrap=None):
+    async def view(conn, entity_id):
+        etag, last_modified, not_modified = await _version(conn, model)
+        if not_modified is not None:
+            return not_modified
+
+        serializer = sparse_serializer(model, request.args)
+        row = (await conn.execute(serializer.select().where(model.id == entity_id))).first()
+        if row is None:
+            return jsonify({"error": missing}), 404
+        entity = dict(zip(serializer.fields, row))
+        response = jsonify(wrap, entity) if wrap else jsonify(entity)
+        return set_validators(response, etag, last_modified)
+    return view
+
+
+async def user_favorites(conn, user_id):
+    favorites = group_favorites(await conn.execute(favorites_select(user_id)))
+    if request.args.get("expand", "").lower() in ("1", "true", "yes"):
+        expanded = {}
+        for kind in FAVORITE_KINDS:
+            ids = favorites[kind.name]
+            stmt = expanded_select(kind, ids)
+            expanded[kind.name] = order_expanded(kind, ids, await conn.execute(stmt)) if stmt is not None else []
+        favorites = expanded
+    return jsonify(favorites)
+
+
+# Flask endpoint -> (async view, name of the URL argument it takes)
+ASYNC_VIEWS = {
+    "api.get_all_character": (lambda conn: catalog_list(conn, Character), None),
+    "api.get_all_planets": (lambda conn: catalog_list(conn, Planet), None),
+    "api.get_all_ships": (lambda conn: catalog_list(conn, Starship), None),
+    "api.get_character_by_id": (_by_id(Character, "No character finded", "Your character is:"), "character_id"),
+    "api.get_planet_by_id": (_by_id(Planet, "No planet finded"), "planet_id"),
+    "api.get_ship_by_id": (_by_id(Starship, "No StarShip finded"), "ship_id"),
+    "api.get_user_favorites": (user_favorites, "user_id"),
+}
+
+
+# ------------------------------ ASGI <-> WSGI ------------------------------
+
+def wsgi_environ(scope, body):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_PROTOCOL": "HTTP/%s" % scope.get("http_version", "1.1"),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    server = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"], environ["SERVER_PORT"] = server[0], str(server[1] or 80)
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1"), value.decode("latin-1")
+        if name == "content-length":
+            key = "CONTENT_LENGTH"
+        elif name == "content-type":
+            key = "CONTENT_TYPE"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+def run_wsgi(environ):
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+
+    iterable = flask_app(environ, start_response)
+    try:
+        body = b"".join(iterable)
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+    return started["status"], started["headers"], body
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+class AsyncApp:
+
+    def __init__(self):
+        self.engine = None
+        self.url = async_database_url()
+        self.executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix="wsgi")
+
+    def async_view(self, environ):
+        if self.url is None or environ["REQUEST_METHOD"] not in ("GET", "HEAD"):
+            return None
+        try:
+            endpoint, args = flask_app.url_map.bind_to_environ(environ).match()
+        except (HTTPException, RequestRedirect):
+            return None
+        if endpoint not in ASYNC_VIEWS:
+            return None
+        view, arg = ASYNC_VIEWS[endpoint]
+        return view, ([args[arg]] if arg else [])
+
+    async def dispatch(self, view, args, environ):
+        if self.engine is None:
+            self.engine = create_engine(self.url)
+        with flask_app.request_context(environ):
+            try:
+                response = flask_app.preprocess_request()
+                if response is None:
+                    async with self.engine.connect() as conn:
+                        response = await view(conn, *args)
+                response = flask_app.make_response(response)
+            except Exception as e:
+                try:
+                    response = flask_app.make_response(flask_app.handle_user_exception(e))
+                except Exception as unhandled:
+                    response = flask_app.make_response(flask_app.handle_exception(unhandled))
+            response = flask_app.process_response(response)
+            body = b"" if environ["REQUEST_METHOD"] == "HEAD" else response.get_data()
+            return response.status_code, response.headers.to_wsgi_list(), body
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, self.warm)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.engine is not None:
+                    await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def warm(self):
+        with flask_app.app_context():
+            try:
+                autocomplete_index.warm()
+            except Exception:
+                logger.exception("autocomplete warm-up failed, it will load on first use")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            raise RuntimeError("Unsupported ASGI scope %r" % scope["type"])
+
+        environ = wsgi_environ(scope, await read_body(receive))
+        matched = self.async_view(environ)
+        if matched is not None:
+            status, headers, body = await self.dispatch(matched[0], matched[1], environ)
+        else:
+            loop = asyncio.get_running_loop()
+            status, headers, body = await loop.run_in_executor(self.executor, run_wsgi, environ)
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+app = AsyncApp()
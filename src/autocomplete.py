@@ -0,0 +1,211 @@
+"""
+In-process prefix index of character, planet and starship names for type-ahead.
+
+Each kind keeps a sorted list of (casefolded name, id) plus an id -> name map, so a
+prefix lookup is two bisects and a slice, with no database round trip. The lists
+are loaded on first use (wsgi.py warms them when a worker boots) and kept current
+by the write handlers of this process, which also move the kind's version to the
+one their write produced. When the catalog version shows that another worker wrote
+to the table, the kind is rebuilt on a background thread and swapped in, lookups
+keep using the old arrays meanwhile. The versions of all kinds are read with one
+query, at most once every AUTOCOMPLETE_REFRESH_SECONDS. AUTOCOMPLETE_MAX_ENTRIES
+bounds the memory used; a kind that does not fit is answered from the database
+instead.
+"""
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left, insort
+from flask import current_app
+from models import db, Character, Planet, Starship
+from versioning import current_versions
+
+AUTOCOMPLETE_MAX_ENTRIES = int(os.getenv("AUTOCOMPLETE_MAX_ENTRIES", 200000))
+AUTOCOMPLETE_REFRESH_SECONDS = float(os.getenv("AUTOCOMPLETE_REFRESH_SECONDS", 5))
+KINDS = {"character": Character, "planet": Planet, "starship": Starship}
+
+logger = logging.getLogger(__name__)
+
+
+def fold(name):
+    return name.casefold()
+
+
+class _KindIndex:
+
+    def __init__(self):
+        self.keys = []       # sorted [(folded name, id)]
+        self.names = {}      # id -> (folded name, name)
+        self.loaded = False
+        self.complete = True
+        self.version = None
+
+
+class PrefixIndex:
+
+    def __init__(self, max_entries=AUTOCOMPLETE_MAX_ENTRIES, refresh_seconds=AUTOCOMPLETE_REFRESH_SECONDS,
+                 background=True):
+        self.max_entries = max_entries
+        self.refresh_seconds = refresh_seconds
+        self.background = background
+        self._kinds = {kind: _KindIndex() for kind in KINDS}
+        self._lock = threading.RLock()
+        self._checked_at = 0.0
+        self._rebuilding = set()
+
+    def size(self):
+        return sum(len(index.keys) for index in self._kinds.values())
+
+    def _load(self, kind, version):
+        """Reads every name of `kind` and swaps the new arrays in. Needs an app context."""
+        model = KINDS[kind]
+        budget = self.max_entries - sum(len(i.keys) for k, i in self._kinds.items() if k != kind)
+        fresh = _KindIndex()
+        rows = db.session.execute(
+            db.select(model.id, model.name).where(model.name.is_not(None)).execution_options(yield_per=5000)
+        )
+        for entity_id, name in rows:
+            if len(fresh.keys) >= budget:
+                fresh.complete = False
+                logger.warning("autocomplete: %s does not fit in %d entries, using the database", kind, self.max_entries)
+                break
+            key = fold(name)
+            fresh.keys.append((key, entity_id))
+            fresh.names[entity_id] = (key, name)
+        rows.close()
+        fresh.keys.sort()
+        fresh.loaded = True
+        fresh.version = version
+        with self._lock:
+            self._kinds[kind] = fresh
+
+    def _rebuild(self, kind, version):
+        """Reloads `kind` on a background thread, the current arrays answer until it is done."""
+        if not self.background:
+            self._load(kind, version)
+            return
+        with self._lock:
+            if kind in self._rebuilding:
+                return
+            self._rebuilding.add(kind)
+        app = current_app._get_current_object()
+
+        def rebuild():
+            try:
+                with app.app_context():
+                    self._load(kind, version)
+            except Exception:
+                logger.exception("autocomplete: rebuilding %s failed, the next check retries", kind)
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(kind)
+
+        threading.Thread(target=rebuild, name="autocomplete-%s" % kind, daemon=True).start()
+
+    def warm(self):
+        """Loads every kind now instead of on the first lookup."""
+        self._ensure_fresh(KINDS, force=True)
+
+    def _ensure_fresh(self, kinds, force=False):
+        """Loads the `kinds` not loaded yet and rebuilds every kind another process wrote to."""
+        missing = [kind for kind in kinds if not self._kinds[kind].loaded]
+        now = time.monotonic()
+        if not (force or missing or now - self._checked_at >= self.refresh_seconds):
+            return
+        self._checked_at = now
+        versions = current_versions(KINDS.values())
+        for kind, model in KINDS.items():
+            version = versions[model.__tablename__]
+            if force or kind in missing:
+                self._load(kind, version)
+            elif self._kinds[kind].loaded and self._kinds[kind].version != version:
+                # written by another worker, the CLI loader or a bulk insert
+                self._rebuild(kind, version)
+
+    def _advance(self, index, version):
+        # only past our own write: if another process wrote in between, the check must still see it
+        if index.version is not None and version == index.version + 1:
+            index.version = version
+
+    def _lookup_database(self, kind, prefix, limit):
+        model = KINDS[kind]
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        rows = db.session.execute(
+            db.select(model.id, model.name)
+            .where(model.name.ilike(escaped + "%", escape="\\"))
+            .order_by(model.name, model.id)
+            .limit(limit)
+        )
+        return [(fold(name), entity_id, name) for entity_id, name in rows]
+
+    def _lookup(self, kind, prefix, limit):
+        index = self._kinds[kind]
+        if not index.complete:
+            return self._lookup_database(kind, prefix, limit)
+        with self._lock:
+            keys = index.keys
+            start = bisect_left(keys, (prefix,))
+            hits = []
+            for key, entity_id in keys[start:start + limit]:
+                if not key.startswith(prefix):
+                    break
+                hits.append((key, entity_id, index.names[entity_id][1]))
+            return hits
+
+    def search(self, prefix, kinds=None, limit=10):
+        """Up to `limit` {type, id, name} whose name starts with `prefix`, in name order."""
+        prefix = fold(prefix)
+        kinds = kinds or list(KINDS)
+        self._ensure_fresh(kinds)
+        hits = []
+        for kind in kinds:
+            hits.extend((key, kind, entity_id, name) for key, entity_id, name in self._lookup(kind, prefix, limit))
+        hits.sort()
+        return [{"type": kind, "id": entity_id, "name": name} for _, kind, entity_id, name in hits[:limit]]
+
+    def add(self, model, entity_id, name, version):
+        """Called after a committed insert in this process, `version` is the one it produced."""
+        index = self._kinds[model.__tablename__]
+        if not index.loaded:
+            return
+        with self._lock:
+            if name is not None:
+                if self.size() >= self.max_entries:
+                    index.complete = False
+                else:
+                    key = fold(name)
+                    insort(index.keys, (key, entity_id))
+                    index.names[entity_id] = (key, name)
+            self._advance(index, version)
+
+    def remove(self, model, entity_id, version):
+        """Called after a committed delete in this process, `version` is the one it produced."""
+        index = self._kinds[model.__tablename__]
+        if not index.loaded:
+            return
+        with self._lock:
+            entry = index.names.pop(entity_id, None)
+            if entry is not None:
+                position = bisect_left(index.keys, (entry[0], entity_id))
+                if position < len(index.keys) and index.keys[position] == (entry[0], entity_id):
+                    del index.keys[position]
+            self._advance(index, version)
+
+    def invalidate(self, model):
+        """
+        Marks a kind stale after a bulk write, it is rebuilt in the background on the
+        next lookup.
+        """
+        with self._lock:
+            self._kinds[model.__tablename__].version = None
+            self._checked_at = 0.0
+
+    def reset(self):
+        """Forgets every kind, each is loaded again on its next lookup (tests, a new database)."""
+        with self._lock:
+            self._kinds = {kind: _KindIndex() for kind in KINDS}
+            self._checked_at = 0.0
+
+
+autocomplete_index = PrefixIndex()
@@ -0,0 +1,123 @@
+"""
+Bulk ingest for the catalog: many records per request, one transaction.
+
+The body is either a JSON array of objects or NDJSON (one object per line, sent
+as application/x-ndjson), which is read from the request stream line by line so
+memory stays flat however large the upload is. Every record is validated once;
+valid ones are inserted with executemany in batches of BULK_BATCH_SIZE, invalid
+ones are reported back by position without aborting the rest.
+"""
+import os
+import json
+from flask import request, current_app
+from utils import APIException
+from models import db, serializer_for
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 500))
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+READ_CHUNK = 64 * 1024
+
+
+def _iter_lines(stream):
+    # readline() on the WSGI input is slow, read big chunks and split them ourselves
+    pending = b""
+    while True:
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def _iter_ndjson(stream):
+    index = 0
+    for line in _iter_lines(stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield index, current_app.json.loads(line)
+        except ValueError as e:
+            yield index, ValueError("Invalid JSON: %s" % e)
+        index += 1
+
+
+def request_records():
+    """
+    Returns an iterator of (index, record) over a JSON array or an NDJSON body.
+    Unparseable NDJSON lines come through as ValueError records.
+    """
+    if request.mimetype in NDJSON_TYPES:
+        return _iter_ndjson(request.stream)
+
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        raise APIException("Body must be a JSON array or NDJSON", status_code=400)
+    return enumerate(records)
+
+
+def validate_record(serializer, record):
+    """Returns the row to insert for `record`, raises ValueError explaining what is wrong with it."""
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+
+    unknown = set(record) - set(serializer.writable)
+    if unknown:
+        raise ValueError("Unknown fields: %s" % ", ".join(sorted(unknown)))
+
+    row = serializer.load(record)
+    for field, value in row.items():
+        if not isinstance(value, SCALAR_TYPES):
+            raise ValueError("Field '%s' must be a string, a number or null" % field)
+        if value is not None and not isinstance(value, str):
+            row[field] = json.dumps(value)
+    if not row.get("name"):
+        raise ValueError("Field 'name' is required")
+    return row
+
+
+def bulk_insert(model, records, batch_size=BULK_BATCH_SIZE):
+    """
+    Validates and inserts `records` ((index, record) pairs) into `model`'s table.
+    Returns (inserted, errors); the caller commits.
+    """
+    serializer = serializer_for(model)
+    table = model.__table__
+    inserted = 0
+    errors = []
+    batch = []
+
+    for index, record in records:
+        try:
+            batch.append(validate_record(serializer, record))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        if len(batch) >= batch_size:
+            db.session.execute(db.insert(table), batch)
+            inserted += len(batch)
+            batch = []
+
+    if batch:
+        db.session.execute(db.insert(table), batch)
+        inserted += len(batch)
+
+    return inserted, errors
+
+
+def batch_size_arg():
+    try:
+        size = int(request.args.get("batch_size", BULK_BATCH_SIZE))
+    except ValueError:
+        raise APIException("batch_size must be an integer", status_code=400)
+    if size < 1:
+        raise APIException("batch_size must be greater than 0", status_code=400)
+    return size
@@ -0,0 +1,255 @@
+"""
+Response cache for the catalog GET endpoints, shared by every gunicorn worker.
+
+Each compressed encoding a client asks for is stored next to the plain body the
+first time it is served, so later hits skip the compression (see compression.py).
+
+The backend speaks the small subset of the redis-py client used here (get, set
+with `ex`, delete, incrby, scan_iter). Point RESPONSE_CACHE_URL at a `redis://`
+server to share it between machines; by default a local SQLite file stands in for
+it so that the workers of one instance share a single cache. Set it to `none` to
+turn caching off.
+"""
+import os
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from functools import wraps
+from urllib.parse import urlencode
+from flask import request, g, current_app, make_response, Response
+from compression import compressor
+
+RESPONSE_CACHE_URL = os.getenv(
+    "RESPONSE_CACHE_URL",
+    "sqlite:///" + os.path.join(tempfile.gettempdir(), "starwars-response-cache.db"),
+)
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 300))
+STATS_FLUSH_SECONDS = 5
+
+
+class SQLiteCache:
+    """Local stand-in for a Redis client, backed by one SQLite file shared between processes."""
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # connections must not cross a fork, gunicorn forks workers after import
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        value = row[0]
+        # counters are stored as INTEGER, hand them back the way Redis does
+        return str(value).encode("ascii") if isinstance(value, int) else bytes(value)
+
+    def set(self, key, value, ex=None):
+        expires = time.time() + ex if ex else None
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        return True
+
+    def delete(self, *keys):
+        if not keys:
+            return 0
+        marks = ",".join("?" * len(keys))
+        return self._conn().execute("DELETE FROM cache WHERE key IN (%s)" % marks, keys).rowcount
+
+    def incrby(self, key, amount=1):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, NULL) "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value",
+            (key, amount),
+        )
+        return int(conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()[0])
+
+    def scan_iter(self, match="*"):
+        # SQLite GLOB understands the same *, ? and [...] patterns as Redis SCAN MATCH
+        rows = self._conn().execute("SELECT key FROM cache WHERE key GLOB ?", (match,)).fetchall()
+        return iter([row[0] for row in rows])
+
+
+def database_id(uri):
+    """Short stable name for a database URL, so that two databases never share cache keys."""
+    return hashlib.sha1(uri.encode("utf-8")).hexdigest()[:12]
+
+
+def _text(key):
+    return key.decode("utf-8") if isinstance(key, bytes) else key
+
+
+def backend_from_url(url):
+    if not url or url.lower() == "none":
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteCache(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+        return redis.Redis.from_url(url)
+    raise ValueError("Unsupported RESPONSE_CACHE_URL: %s" % url)
+
+
+# headers a cached body cannot be served without, the validators are added by @conditional
+STORED_HEADERS = ("Content-Type", "Content-Encoding", "Link")
+
+
+def _dump_response(response):
+    head = "\r\n".join(
+        "%s: %s" % (name, response.headers[name]) for name in STORED_HEADERS if name in response.headers
+    )
+    return head.encode("latin-1") + b"\r\n\r\n" + response.get_data()
+
+
+def _load_response(stored):
+    head, _, body = stored.partition(b"\r\n\r\n")
+    headers = [line.split(": ", 1) for line in head.decode("latin-1").split("\r\n")]
+    return Response(body, status=200, headers=headers)
+
+
+class ResponseCache:
+    """
+    Caches whole GET responses under
+    `<prefix>:<database>:<table>:<version>.<modified>:<url>?<sorted args>`, and their
+    gzip / brotli encodings under the same key plus `#gzip` / `#br`.
+
+    The table version (set on `g` by versioning.conditional) is part of the key, so a
+    reader racing a write can never pin an old body to a new ETag; `invalidate` then
+    just drops the keys of the old versions. Versions start over at 1 whenever a
+    database is recreated, so the key also carries a hash of the database URL and
+    the time of the last write. The URL includes scheme and host because cached
+    bodies hold absolute `next` / Link URLs.
+    """
+
+    def __init__(self, backend, ttl=RESPONSE_CACHE_TTL, prefix="starwars:response"):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self._hits = 0
+        self._misses = 0
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def namespace(self, model):
+        database = database_id(current_app.config["SQLALCHEMY_DATABASE_URI"])
+        return "%s:%s:%s" % (self.prefix, database, model.__tablename__)
+
+    def key_for(self, model):
+        # re-encoded, so that an escaped "&" or "=" inside a value cannot pass for a separator
+        args = urlencode(sorted(request.args.items(multi=True)))
+        modified = g.get("catalog_modified")
+        version = "%s.%d" % (g.get("catalog_version", "-"), modified.timestamp() if modified else 0)
+        return "%s:%s:%s?%s" % (self.namespace(model), version, request.base_url, args)
+
+    def _store_encoded(self, key, encoding, response):
+        """
+        Compresses `response` for `encoding` and stores it under the encoding's key.
+        Bodies too small to compress are stored plain there too, so that the next
+        hit finds them with one lookup.
+        """
+        compressor.encode(response, encoding)
+        stored = _dump_response(response)
+        self.backend.set("%s#%s" % (key, encoding), stored, ex=self.ttl)
+        return stored
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+            if time.monotonic() - self._flushed_at >= STATS_FLUSH_SECONDS:
+                self._flush_stats()
+
+    def _flush_stats(self):
+        hits, misses = self._hits, self._misses
+        self._hits = self._misses = 0
+        self._flushed_at = time.monotonic()
+        if hits:
+            self.backend.incrby(self.prefix + ":stats:hits", hits)
+        if misses:
+            self.backend.incrby(self.prefix + ":stats:misses", misses)
+
+    def cached(self, model):
+        """Decorates a GET view so that its 200 responses are served from the shared cache."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return view(*args, **kwargs)
+
+                key = self.key_for(model)
+                encoding = compressor.negotiate()
+                if encoding is None:
+                    stored = self.backend.get(key)
+                else:
+                    stored = self.backend.get("%s#%s" % (key, encoding))
+                    if stored is None:
+                        # first client asking for this encoding since the body was cached
+                        plain = self.backend.get(key)
+                        if plain is not None:
+                            stored = self._store_encoded(key, encoding, _load_response(plain))
+                if stored is not None:
+                    self._count(hit=True)
+                    return _load_response(stored)
+
+                self._count(hit=False)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    self.backend.set(key, _dump_response(response), ex=self.ttl)
+                    if encoding is not None:
+                        self._store_encoded(key, encoding, response)
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, model):
+        """Drops every cached response of `model`'s table."""
+        if self.backend is None:
+            return 0
+        keys = list(self.backend.scan_iter(match=self.namespace(model) + ":*"))
+        return self.backend.delete(*keys) if keys else 0
+
+    def stats(self):
+        if self.backend is None:
+            return {"enabled": False}
+        with self._lock:
+            self._flush_stats()
+        hits = int(self.backend.get(self.prefix + ":stats:hits") or 0)
+        misses = int(self.backend.get(self.prefix + ":stats:misses") or 0)
+        total = hits + misses
+        return {
+            "enabled": True,
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+            "entries": sum(1 for key in self.backend.scan_iter(match=self.prefix + ":*")
+                           if not _text(key).startswith(self.prefix + ":stats:")),
+        }
+
+
+response_cache = ResponseCache(backend_from_url(RESPONSE_CACHE_URL))
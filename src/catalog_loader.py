@@ -0,0 +1,248 @@
+"""
+`flask catalog load <dump.json>`: seeds the catalog from a local SWAPI dump.
+
+The dump is a JSON object with `people` (or `characters`), `planets` and
+`starships` arrays of SWAPI records, either flat or wrapped in `properties` the
+way swapi.tech returns them. It is parsed incrementally, one record at a time, so
+memory stays flat whatever the size of the file, and rows go in with COPY on
+Postgres and executemany elsewhere, one transaction per batch. Each batch bumps
+its table's version in that same transaction and then drops the table's cached
+responses, so API readers never get a page or ETag from before the batch.
+
+After every committed batch the number of records done per section is written to
+a checkpoint file; running the same command again resumes after the last
+committed batch. No network access is needed.
+"""
+import io
+import os
+import re
+import json
+import time
+import click
+from flask.cli import AppGroup
+from models import db, Character, Planet, Starship, serializer_for, with_numeric_shadows
+from versioning import bump_version
+from cache import response_cache
+
+READ_CHUNK = 256 * 1024
+DEFAULT_BATCH_SIZE = 1000
+
+# dump section -> model, and the SWAPI spelling of the fields we store differently
+SECTIONS = {
+    "people": Character,
+    "characters": Character,
+    "planets": Planet,
+    "starships": Starship,
+}
+SWAPI_ALIASES = {
+    "passangers": "passengers",
+    "consumable": "consumables",
+}
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class DumpReader:
+    """Incremental reader for `{"section": [record, ...], ...}` JSON documents."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.fp.read(READ_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError("Expected %r at offset %d of the dump" % (char, self.pos))
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # most likely the value runs past the end of the buffer
+                if self.eof or not self._fill():
+                    raise
+                continue
+            if end == len(self.buf) and not self.eof and self._fill():
+                # a number may have been cut in half, decode it again with more input
+                continue
+            self.pos = end
+            return value
+
+    def _items(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            separator = self._peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError("Expected ',' or ']' at offset %d of the dump" % (self.pos - 1))
+
+    def sections(self):
+        """Yields (name, records_iterator) for every array member of the top-level object."""
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            name = self._value()
+            self._expect(":")
+            if self._peek() == "[":
+                items = self._items()
+                yield name, items
+                for _ in items:  # drain what the caller did not consume
+                    pass
+            else:
+                self._value()
+            separator = self._peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError("Expected ',' or '}' at offset %d of the dump" % (self.pos - 1))
+
+
+def swapi_row(serializer, record):
+    """Maps one SWAPI record to a row of `serializer`'s table, every value stored as text."""
+    if isinstance(record.get("properties"), dict):
+        record = record["properties"]
+    row = {}
+    for field in serializer.writable:
+        value = record.get(field, record.get(SWAPI_ALIASES.get(field, field)))
+        if value is not None and not isinstance(value, str):
+            value = json.dumps(value)
+        row[field] = value
+    return row
+
+
+def _copy_text(value):
+    if value is None:
+        return "\\N"
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def insert_batch(model, rows):
+    """COPY on Postgres (psycopg2), a single executemany INSERT everywhere else."""
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg2":
+        # COPY skips column defaults, so the numeric shadow columns are filled here
+        rows = [with_numeric_shadows(model, row) for row in rows]
+        fields = list(rows[0])
+        data = io.StringIO("".join("\t".join(_copy_text(row[f]) for f in fields) + "\n" for row in rows))
+        columns = ", ".join('"%s"' % f for f in fields)
+        cursor = connection.connection.driver_connection.cursor()
+        cursor.copy_expert('COPY "%s" (%s) FROM STDIN' % (model.__tablename__, columns), data)
+    else:
+        db.session.execute(db.insert(model.__table__), rows)
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fp:
+        return json.load(fp)
+
+
+def write_checkpoint(path, done):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fp:
+        json.dump(done, fp)
+    os.replace(tmp, path)
+
+
+def load_dump(path, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, echo=click.echo):
+    """Loads the dump at `path`, returns {section: rows_inserted}."""
+    checkpoint = checkpoint or path + ".checkpoint"
+    done = read_checkpoint(checkpoint)
+    if done:
+        echo("Resuming from %s: %s" % (checkpoint, ", ".join("%s=%d" % item for item in done.items())))
+
+    inserted = {}
+    with open(path, encoding="utf-8") as fp:
+        for section, records in DumpReader(fp).sections():
+            model = SECTIONS.get(section)
+            if model is None:
+                echo("Skipping unknown section '%s'" % section)
+                continue
+
+            serializer = serializer_for(model)
+            skip = done.get(section, 0)
+            position = 0
+            count = 0
+            batch = []
+            started = time.perf_counter()
+
+            def flush():
+                insert_batch(model, batch)
+                # readers see the new rows and the new version together
+                bump_version(model)
+                db.session.commit()
+                response_cache.invalidate(model)
+                done[section] = position
+                write_checkpoint(checkpoint, done)
+
+            for record in records:
+                position += 1
+                if position <= skip or not isinstance(record, dict):
+                    continue
+                batch.append(swapi_row(serializer, record))
+                count += 1
+                if len(batch) >= batch_size:
+                    flush()
+                    batch = []
+            if batch:
+                flush()
+
+            elapsed = time.perf_counter() - started
+            inserted[section] = count
+            echo("%-10s %8d rows in %6.2fs (%.0f rows/s)" % (section, count, elapsed, count / elapsed if elapsed else 0))
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return inserted
+
+
+catalog_cli = AppGroup("catalog", help="Catalog maintenance commands.")
+
+
+@catalog_cli.command("load")
+@click.argument("dump", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=DEFAULT_BATCH_SIZE, show_default=True, help="Rows per transaction.")
+@click.option("--checkpoint", default=None, help="Checkpoint file, defaults to <dump>.checkpoint.")
+@click.option("--restart", is_flag=True, help="Ignore an existing checkpoint and load from the start.")
+def load_command(dump, batch_size, checkpoint, restart):
+    """Load characters, planets and starships from a local SWAPI JSON dump."""
+    checkpoint = checkpoint or dump + ".checkpoint"
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    started = time.perf_counter()
+    inserted = load_dump(dump, batch_size=batch_size, checkpoint=checkpoint)
+    elapsed = time.perf_counter() - started
+    total = sum(inserted.values())
+    click.echo("Loaded %d rows in %.2fs (%.0f rows/s)" % (total, elapsed, total / elapsed if elapsed else 0))
@@ -0,0 +1,83 @@
+"""
+Negotiated response compression.
+
+JSON and text responses of COMPRESS_MIN_SIZE bytes or more are sent brotli or gzip
+encoded, whichever the client's Accept-Encoding prefers (brotli on a tie). Brotli
+needs the optional `brotli` package (`pipenv install brotli`), without it only gzip
+is offered. Set COMPRESSION=off when a proxy in front of the app compresses already.
+
+Cached catalog responses are compressed once: the response cache keeps every
+encoding it has served next to the plain body, under the same versioned key (see
+cache.py). A response that already has a Content-Encoding is left as it is.
+"""
+import os
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION", "true").lower() in ("1", "true", "yes", "on")
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript")
+
+
+class Compressor:
+
+    def __init__(self, enabled=COMPRESSION_ENABLED, min_size=COMPRESS_MIN_SIZE, gzip_level=GZIP_LEVEL,
+                 brotli_quality=BROTLI_QUALITY):
+        self.enabled = enabled
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        # the order breaks ties between encodings the client accepts equally
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def negotiate(self):
+        """The encoding to answer the current request with, None for the plain body."""
+        if not self.enabled:
+            return None
+        return request.accept_encodings.best_match(self.encodings)
+
+    def compressible(self, response):
+        return self.enabled and (response.mimetype.startswith("text/") or response.mimetype in COMPRESSIBLE_TYPES)
+
+    def compress(self, data, encoding):
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_quality)
+        # mtime=0 keeps the bytes identical for identical bodies
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def encode(self, response, encoding):
+        """
+        Compresses `response` in place for `encoding` when it is worth it. Returns
+        whether it did.
+        """
+        if (encoding is None or response.direct_passthrough or "Content-Encoding" in response.headers
+                or not self.compressible(response) or not 200 <= response.status_code < 300):
+            return False
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return False
+        response.set_data(self.compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return True
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+
+        @app.after_request
+        def compress_response(response):
+            if self.compressible(response):
+                response.vary.add("Accept-Encoding")
+                self.encode(response, self.negotiate())
+            return response
+
+
+compressor = Compressor()
@@ -0,0 +1,140 @@
+"""
+Connection pool settings from the environment, and what the pool is doing.
+
+`engine_options(uri)` builds SQLALCHEMY_ENGINE_OPTIONS from:
+
+    DB_POOL_SIZE             connections kept open per worker (5)
+    DB_MAX_OVERFLOW          extra connections allowed under load (10)
+    DB_POOL_TIMEOUT          seconds to wait for a free connection before failing (30)
+    DB_POOL_RECYCLE          reconnect connections older than this, in seconds (1800, -1 disables)
+    DB_POOL_PRE_PING         test connections on checkout, survives database restarts (true)
+    DB_STATEMENT_TIMEOUT_MS  abort statements running longer than this (0 = no limit,
+                             Postgres and MySQL only)
+
+The pool counts checkouts, connects and invalidations from its events and times how
+long each checkout waited for a connection. `pool_metrics.stats()` returns them with
+the current checked-out and overflow numbers, GET /db/pool/stats serves them and,
+with DB_POOL_LOG_SECONDS set, they are logged at most that often. Numbers are per
+worker process, which is what pool_size and max_overflow apply to.
+"""
+import os
+import time
+import logging
+import threading
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+DB_POOL_LOG_SECONDS = float(os.getenv("DB_POOL_LOG_SECONDS", 0))
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name, default):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+class PoolMetrics:
+
+    def __init__(self, log_seconds=DB_POOL_LOG_SECONDS):
+        self.log_seconds = log_seconds
+        self.pool = None
+        self._lock = threading.Lock()
+        self._logged_at = time.monotonic()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.waits = 0           # checkouts that found no idle connection
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds, had_to_wait):
+        with self._lock:
+            if had_to_wait:
+                self.waits += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def attach(self, engine):
+        self.pool = engine.pool
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            self.connects += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts += 1
+            if self.log_seconds and time.monotonic() - self._logged_at >= self.log_seconds:
+                self._logged_at = time.monotonic()
+                logger.info("db pool: %s", " ".join("%s=%s" % item for item in self.stats().items()))
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self.invalidations += 1
+
+    def stats(self):
+        pool = self.pool
+        timed = isinstance(pool, QueuePool)
+        return {
+            "pid": os.getpid(),
+            "pool": type(pool).__name__ if pool is not None else None,
+            "size": pool.size() if timed else None,
+            "checked_out": pool.checkedout() if timed else None,
+            "overflow": pool.overflow() if timed else None,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "wait_ms_total": round(self.wait_seconds * 1000, 3),
+            "wait_ms_max": round(self.max_wait_seconds * 1000, 3),
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long getting a connection took to `pool_metrics`."""
+
+    def _do_get(self):
+        had_to_wait = self.checkedout() >= self.size()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started, had_to_wait)
+
+
+def engine_options(uri):
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # in-memory SQLite is one connection per thread, there is no pool to size
+        return {}
+
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),  # engine_from_config truncates it to int anyway
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", "true"),
+    }
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+    if statement_timeout:
+        if url.get_backend_name() == "postgresql":
+            options["connect_args"] = {"options": "-c statement_timeout=%d" % statement_timeout}
+        elif url.get_backend_name() == "mysql":
+            options["connect_args"] = {"init_command": "SET SESSION max_execution_time=%d" % statement_timeout}
+        else:
+            logger.warning("DB_STATEMENT_TIMEOUT_MS is not supported on %s, ignoring it", url.get_backend_name())
+    return options
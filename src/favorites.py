@@ -0,0 +1,155 @@
+"""
+Reads and writes of a user's favorites across the three favorite tables.
+"""
+from sqlalchemy import literal, union_all
+from sqlalchemy.exc import IntegrityError
+from models import db, FAVORITE_KINDS, serializer_for
+
+# "character" -> FavoriteKind, as used by the /favorites/<entity> routes
+KIND_BY_ENTITY = {kind.entity.__tablename__: kind for kind in FAVORITE_KINDS}
+
+
+def favorites_select(user_id):
+    """
+    One UNION ALL statement over the three favorite tables instead of one query per
+    table, rows are (kind, favorite_id, entity_id).
+    """
+    return union_all(*[
+        db.select(
+            literal(kind.name).label("kind"),
+            kind.model.id.label("favorite_id"),
+            kind.entity_id.label("entity_id"),
+        ).where(kind.model.user_id == user_id)
+        for kind in FAVORITE_KINDS
+    ]).order_by("kind", "favorite_id")
+
+
+def group_favorites(rows):
+    favorites = {kind.name: [] for kind in FAVORITE_KINDS}
+    for kind, _, entity_id in rows:
+        favorites[kind].append(entity_id)
+    return favorites
+
+
+def load_favorites(user_id):
+    """Returns {"characters": [ids], "planets": [ids], "starships": [ids]}."""
+    return group_favorites(db.session.execute(favorites_select(user_id)))
+
+
+def expanded_select(kind, ids):
+    """The serialized entities of one favorite kind, None when there are no ids to load."""
+    if not ids:
+        return None
+    serializer = serializer_for(kind.entity)
+    return serializer.select().where(kind.entity.id.in_(set(ids)))
+
+
+def order_expanded(kind, ids, rows):
+    """Puts the loaded entities back in favorites order, dropping ids that no longer exist."""
+    by_id = {row["id"]: row for row in serializer_for(kind.entity).rows(rows)}
+    return [by_id[entity_id] for entity_id in ids if entity_id in by_id]
+
+
+def expand_favorites(favorites):
+    """
+    Replaces the ids of `load_favorites` with the serialized entities, loading each
+    kind with one `id IN (...)` query.
+    """
+    expanded = {}
+    for kind in FAVORITE_KINDS:
+        ids = favorites[kind.name]
+        stmt = expanded_select(kind, ids)
+        expanded[kind.name] = order_expanded(kind, ids, db.session.execute(stmt)) if stmt is not None else []
+    return expanded
+
+
+def _insert_ignoring_duplicates(kind, rows):
+    """
+    INSERT that silently skips pairs that already exist, in a single statement:
+    ON CONFLICT DO NOTHING on Postgres and SQLite, INSERT IGNORE on MySQL.
+    Returns the number of rows actually inserted.
+    """
+    table = kind.model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).on_conflict_do_nothing(index_elements=["user_id", kind.entity_id.key])
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).on_conflict_do_nothing(index_elements=["user_id", kind.entity_id.key])
+    elif dialect in ("mysql", "mariadb"):
+        stmt = db.insert(table).prefix_with("IGNORE")
+    else:
+        inserted = 0
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(table).values(**row))
+                inserted += 1
+            except IntegrityError:
+                pass
+        return inserted
+    return db.session.execute(stmt, rows).rowcount
+
+
+def add_favorite(kind, user_id, entity_id):
+    """Adds one favorite, a no-op if the user already has it. The caller commits."""
+    return add_favorites(kind, user_id, [entity_id])
+
+
+def add_favorites(kind, user_id, entity_ids):
+    """Adds many favorites of one kind in one statement, skipping those the user already has."""
+    if not entity_ids:
+        return 0
+    rows = [{"user_id": user_id, kind.entity_id.key: entity_id} for entity_id in dict.fromkeys(entity_ids)]
+    return _insert_ignoring_duplicates(kind, rows)
+
+
+def remove_favorite(kind, user_id, entity_id):
+    """Single `DELETE ... WHERE user_id = ? AND <entity>_id = ?`, returns the rows removed. The caller commits."""
+    result = db.session.execute(
+        db.delete(kind.model).where(kind.model.user_id == user_id, kind.entity_id == entity_id)
+    )
+    return result.rowcount
+
+
+def remove_favorites(kind, user_id, entity_ids):
+    """Single `DELETE ... WHERE user_id = ? AND <entity>_id IN (...)`, returns the rows removed."""
+    if not entity_ids:
+        return 0
+    result = db.session.execute(
+        db.delete(kind.model).where(kind.model.user_id == user_id, kind.entity_id.in_(set(entity_ids)))
+    )
+    return result.rowcount
+
+
+def parse_favorite_changes(changes):
+    """
+    Validates one side ("add" or "remove") of a batch body, e.g. {"characters": [1, 2]},
+    and returns {FavoriteKind: [ids]}. Raises ValueError on anything else.
+    """
+    if changes is None:
+        return {}
+    if not isinstance(changes, dict):
+        raise ValueError("must be an object keyed by characters, planets or starships")
+
+    kinds = {kind.name: kind for kind in FAVORITE_KINDS}
+    parsed = {}
+    for name, ids in changes.items():
+        if name not in kinds:
+            raise ValueError("unknown favorite kind '%s'" % name)
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise ValueError("'%s' must be a list of ids" % name)
+        parsed[kinds[name]] = ids
+    return parsed
+
+
+def apply_favorite_changes(user_id, adds, removes):
+    """
+    Runs a whole favorites sync: one DELETE and one INSERT per kind at most, in the
+    current transaction. Removes run first, so an id listed on both sides ends up added.
+    Returns (added, removed) row counts; the caller commits.
+    """
+    removed = sum(remove_favorites(kind, user_id, ids) for kind, ids in removes.items())
+    added = sum(add_favorites(kind, user_id, ids) for kind, ids in adds.items())
+    return added, removed
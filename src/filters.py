@@ -0,0 +1,91 @@
+"""
+Query-string filters for the catalog list endpoints, compiled to SQL so the
+database only returns matching rows, and sparse fieldsets (`?fields=`) so it only
+returns the columns the client reads.
+"""
+from utils import APIException
+from models import Character, Planet, Starship, NUMERIC_FIELDS, serializer_for
+
+# text columns that can be matched with `?<field>=<value>`, each backed by a (field, id) index
+FILTERABLE_FIELDS = {
+    Character: ("gender", "eye_color", "hair_color"),
+    Planet: ("climate", "terrain"),
+    Starship: ("starship_class", "manufacturer", "model"),
+}
+RANGE_PREFIXES = ("min_", "max_")
+# query args that belong to other features of the list endpoints
+RESERVED_ARGS = {"limit", "after", "sort", "fields"}
+
+
+def sort_columns(model):
+    """
+    Public sort keys of `model`: its name, the filterable fields, and every numeric
+    field sorted on its parsed column.
+    """
+    columns = {"name": model.name}
+    columns.update((field, getattr(model, field)) for field in FILTERABLE_FIELDS.get(model, ()))
+    columns.update(NUMERIC_FIELDS.get(model, {}))
+    return columns
+
+
+def range_filters(model, args):
+    """
+    Turns `?min_<field>=` / `?max_<field>=` into inclusive conditions on the numeric
+    shadow column of `field`, e.g. `?min_population=1000000000` on planets.
+    """
+    numeric = NUMERIC_FIELDS.get(model, {})
+    conditions = []
+    for arg, raw in args.items():
+        prefix = arg[:4]
+        if prefix not in RANGE_PREFIXES:
+            continue
+        field = arg[4:]
+        if field not in numeric:
+            raise APIException("Cannot filter on a range of '%s'" % field, status_code=400)
+        try:
+            value = float(raw)
+        except ValueError:
+            raise APIException("%s must be a number" % arg, status_code=400)
+        column = numeric[field]
+        conditions.append(column >= value if prefix == "min_" else column <= value)
+    return conditions
+
+
+def field_filters(model, args):
+    """
+    Turns `?<field>=<value>` into an equality condition on a whitelisted column;
+    repeating the argument (`?gender=male&gender=female`) matches any of the values.
+    """
+    allowed = FILTERABLE_FIELDS.get(model, ())
+    conditions = []
+    for arg in args:
+        if arg in RESERVED_ARGS or arg[:4] in RANGE_PREFIXES:
+            continue
+        if arg not in allowed:
+            raise APIException("Cannot filter by '%s'" % arg, status_code=400)
+        values = args.getlist(arg)
+        column = getattr(model, arg)
+        conditions.append(column == values[0] if len(values) == 1 else column.in_(values))
+    return conditions
+
+
+def catalog_filters(model, args):
+    """Every WHERE condition requested by the query string of a catalog list endpoint."""
+    return field_filters(model, args) + range_filters(model, args)
+
+
+def sparse_serializer(model, args):
+    """
+    The serializer for `?fields=name,model`: only those columns (and `id`) are
+    selected and returned. Without the argument, every field.
+    """
+    serializer = serializer_for(model)
+    if "fields" not in args:
+        return serializer
+    fields = [field.strip() for arg in args.getlist("fields") for field in arg.split(",") if field.strip()]
+    if not fields:
+        raise APIException("fields must name at least one field", status_code=400)
+    for field in fields:
+        if field not in serializer.fields:
+            raise APIException("Unknown field '%s', use: %s" % (field, ", ".join(serializer.fields)), status_code=400)
+    return serializer.only(fields)
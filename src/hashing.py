@@ -0,0 +1,79 @@
+"""
+Password hashing on a bounded pool, so a burst of logins cannot take every worker.
+
+bcrypt is deliberately slow. Run inline, a burst of sign-ups or logins keeps every
+worker busy hashing while catalog reads wait behind them. Here the hashing runs on a
+small per-process thread pool (bcrypt releases the GIL, so threads give real
+parallelism) and at most PASSWORD_HASH_QUEUE requests may be waiting or running at
+once; past that the request is refused right away with 503 and Retry-After instead
+of queueing.
+
+The limits are per process, so they only mean something when a process serves
+several requests at once: the Procfile runs gthread workers with 8 threads each.
+Keep PASSWORD_HASH_QUEUE below the number of threads, the rest stay free for reads.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from flask import current_app
+from utils import APIException
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 4))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", 2))
+
+
+class PasswordHasherBusy(APIException):
+    status_code = 503
+
+    def __init__(self, retry_after=PASSWORD_HASH_RETRY_AFTER):
+        APIException.__init__(self, "Too many password operations in progress, retry shortly.")
+        self.headers = {"Retry-After": str(retry_after)}
+
+
+class PasswordHasher:
+
+    def __init__(self, bcrypt, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_QUEUE,
+                 timeout=PASSWORD_HASH_TIMEOUT):
+        self.bcrypt = bcrypt
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(max_pending, workers))
+        self._executor = None
+        self._pid = None
+
+    def _pool(self):
+        # gunicorn forks after import, each worker needs its own threads
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._pool().submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy()
+
+    def hash(self, password):
+        return self._run(self.bcrypt.generate_password_hash, password).decode("utf-8")
+
+    def check(self, pw_hash, password):
+        return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """True when `pw_hash` was made with a different cost than BCRYPT_LOG_ROUNDS."""
+        try:
+            rounds = int(pw_hash.split("$")[2])
+        except (IndexError, ValueError, AttributeError):
+            return True
+        return rounds != current_app.config["BCRYPT_LOG_ROUNDS"]
@@ -0,0 +1,113 @@
+"""
+Resolves the user behind a JWT without a query per request.
+
+`setup_identity(jwt)` registers a user loader that reads `{id, username, mail}`
+from a per-process cache kept for IDENTITY_CACHE_TTL seconds (users that do not
+exist are remembered too), so `get_current_user()` in a @jwt_required view is a
+dict lookup in the common case. Handlers that change a user call
+`identity_cache.invalidate(user_id)`; other workers pick the change up when
+their entry expires.
+
+With JWT_REVOCATION=shared, tokens can also be revoked (DELETE /token). Revoked
+token ids are kept until the token would have expired anyway, in the backend of
+JWT_REVOCATION_URL (RESPONSE_CACHE_URL by default, see cache.py), so every worker
+that shares it, and the workers of a restarted instance, refuse them.
+"""
+import os
+import time
+import threading
+from models import db, User
+from cache import backend_from_url, RESPONSE_CACHE_URL
+
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", 60))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", 10000))
+JWT_REVOCATION = os.getenv("JWT_REVOCATION", "none").lower()
+JWT_REVOCATION_URL = os.getenv("JWT_REVOCATION_URL", RESPONSE_CACHE_URL)
+
+
+class IdentityCache:
+    """user_id -> minimal user record (or None for a missing user), per process, with a TTL."""
+
+    def __init__(self, ttl=IDENTITY_CACHE_TTL, max_entries=IDENTITY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fetch(self, user_id):
+        row = db.session.execute(
+            db.select(User.id, User.username, User.mail).where(User.id == user_id)
+        ).first()
+        return None if row is None else {"id": row.id, "username": row.username, "mail": row.mail}
+
+    def get(self, user_id):
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        record = self._fetch(user_id)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[user_id] = (now + self.ttl, record)
+        return record
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class RevokedTokens:
+    """Revoked token ids in a shared cache backend, each kept until its token expires."""
+
+    def __init__(self, backend, prefix="starwars:revoked"):
+        self.backend = backend
+        self.prefix = prefix
+
+    def revoke(self, jti, expires):
+        ttl = int(expires - time.time()) + 1
+        if ttl > 0:
+            self.backend.set("%s:%s" % (self.prefix, jti), b"1", ex=ttl)
+
+    def __contains__(self, jti):
+        return self.backend.get("%s:%s" % (self.prefix, jti)) is not None
+
+
+def revoked_tokens_from_config(mode=JWT_REVOCATION, url=JWT_REVOCATION_URL):
+    if mode == "none":
+        return None
+    if mode != "shared":
+        raise ValueError("Unsupported JWT_REVOCATION: %s" % mode)
+    backend = backend_from_url(url)
+    if backend is None:
+        raise ValueError("JWT_REVOCATION=shared needs JWT_REVOCATION_URL or RESPONSE_CACHE_URL")
+    return RevokedTokens(backend)
+
+
+identity_cache = IdentityCache()
+revoked_tokens = revoked_tokens_from_config()
+
+
+def setup_identity(jwt):
+    @jwt.user_lookup_loader
+    def load_user(_jwt_header, jwt_data):
+        try:
+            user_id = int(jwt_data["sub"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return identity_cache.get(user_id)
+
+    if revoked_tokens is not None:
+        @jwt.token_in_blocklist_loader
+        def is_revoked(_jwt_header, jwt_data):
+            return jwt_data.get("jti", "") in revoked_tokens
@@ -0,0 +1,92 @@
+"""
+The app's JSON provider: orjson when it is installed, Flask's stdlib provider
+otherwise. JSON_PROVIDER=stdlib forces the stdlib one, JSON_PROVIDER=orjson fails
+at startup when orjson is missing (`pipenv install orjson`).
+
+Responses come out byte for byte as the stdlib provider writes them (sorted keys,
+compact separators, ensure_ascii). Where orjson writes something else, this
+module makes up for it:
+
+- non-ASCII text is escaped afterwards, like ensure_ascii does;
+- dates, datetimes and dataclasses go through Flask's `default` (HTTP dates);
+- floats below 1e-4 or from 1e16 up are written by orjson without Python's
+  exponent form (0.00001 instead of 1e-05), such bodies are encoded again with
+  the stdlib, as is anything orjson refuses (ints over 64 bits, non-string keys);
+- indented output (debug mode) and extra json.dumps arguments use the stdlib.
+
+NaN and Infinity, which are not JSON, come out as null instead of NaN; none of our
+payloads can hold them (SQLite stores NaN as NULL).
+
+Parsing falls back to the stdlib for input orjson rejects (NaN, lone surrogates,
+UTF-16) and for numbers of 19 digits or more, which orjson would turn into floats.
+"""
+import os
+import re
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_PROVIDER = os.getenv("JSON_PROVIDER", "auto").lower()
+
+COMPACT = (",", ":")
+_NON_ASCII = re.compile("[^\x00-\x7e]")    # ensure_ascii escapes DEL too
+_EXPONENT = re.compile(rb"e[-0-9]")        # 1e16, 1.5e-7; inside strings it only costs a fallback
+_SMALL_FLOAT = b"0.0000"
+# every digit becomes "0" and everything else a space, so a long number is a run of zeros
+_DIGITS = bytes(0x30 if 0x30 <= c <= 0x39 else 0x20 for c in range(256))
+_LONG_NUMBER = b"0" * 19
+
+
+def _escape(match):
+    code = ord(match.group())
+    if code > 0xFFFF:
+        code -= 0x10000
+        return "\\u%04x\\u%04x" % (0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+    return "\\u%04x" % code
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the work whenever the result is the same."""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs != {"separators": COMPACT}:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            data = orjson.dumps(obj, default=self.default, option=option)
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, **kwargs)
+        if _SMALL_FLOAT in data or _EXPONENT.search(data):
+            return super().dumps(obj, **kwargs)
+
+        text = data.decode("utf-8")
+        if self.ensure_ascii and (not data.isascii() or b"\x7f" in data):
+            text = _NON_ASCII.sub(_escape, text)
+        return text
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        raw = s.encode("utf-8", "surrogatepass") if isinstance(s, str) else s
+        if _LONG_NUMBER in raw.translate(_DIGITS):
+            return super().loads(s)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            return super().loads(s)
+
+
+def provider_class(name=JSON_PROVIDER):
+    if name == "stdlib" or (name == "auto" and orjson is None):
+        return DefaultJSONProvider
+    if name not in ("auto", "orjson"):
+        raise ValueError("Unsupported JSON_PROVIDER: %s" % name)
+    if orjson is None:
+        raise ValueError("JSON_PROVIDER=orjson needs the orjson package")
+    return OrjsonProvider
@@ -0,0 +1,291 @@
+"""
+Prometheus metrics for GET /metrics, summed over every worker process.
+
+Each process counts in memory:
+
+    http_requests_total{endpoint,method,status}            counter
+    http_request_duration_seconds{endpoint,method}         histogram
+    db_statements_total{endpoint}                          counter
+    db_statement_duration_seconds{endpoint}                histogram
+    json_serialization_duration_seconds{endpoint}          histogram
+
+SQL is timed with the engine's before/after_cursor_execute events, serialization
+around the app's JSON encoder, and `endpoint` is the Flask endpoint that was
+running ("none" outside a request). Every METRICS_FLUSH_SECONDS a process writes
+its totals to METRICS_DIR/<pid>-<token>.json, the token keeping apart two
+processes that got the same pid; /metrics adds up every file of the directory.
+Files of processes that are gone are merged into archive.json first, so counts
+of workers that were restarted are kept and the directory does not grow.
+
+gunicorn.conf.py empties METRICS_DIR when the gunicorn master starts, so counts
+begin at zero with every deploy. Other servers should be started with a fresh or
+empty METRICS_DIR.
+"""
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import tempfile
+import threading
+from flask import request, g, has_request_context
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "starwars-metrics"))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 1))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SERIALIZATION_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "http_requests_total": ("counter", "Requests answered, by endpoint and status.", None),
+    "http_request_duration_seconds": ("histogram", "Time to answer a request.", LATENCY_BUCKETS),
+    "db_statements_total": ("counter", "SQL statements executed.", None),
+    "db_statement_duration_seconds": ("histogram", "Time spent executing one SQL statement.", SQL_BUCKETS),
+    "json_serialization_duration_seconds": ("histogram", "Time spent encoding one JSON body.", SERIALIZATION_BUCKETS),
+}
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or "none"
+    return "none"
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+class Metrics:
+
+    def __init__(self, directory=METRICS_DIR, flush_seconds=METRICS_FLUSH_SECONDS):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._filename = "%d-%s.json" % (self._pid, uuid.uuid4().hex[:8])
+        self._values = {}     # key -> counter value, or [bucket counts..., sum, count]
+        self._flushed_at = 0.0
+
+    def _check_fork(self):
+        # a forked worker starts from zero, what the parent counted is in the parent's file
+        if self._pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, labels, value=1):
+        key = _key(name, labels)
+        with self._lock:
+            self._check_fork()
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, name, labels, seconds):
+        buckets = METRICS[name][2]
+        key = _key(name, labels)
+        with self._lock:
+            self._check_fork()
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if seconds <= bound:
+                    values[i] += 1
+                    break
+            values[-2] += seconds
+            values[-1] += 1
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._flushed_at < self.flush_seconds:
+            return
+        with self._lock:
+            self._check_fork()
+            self._flushed_at = now
+            data = json.dumps(self._values)
+            filename = self._filename
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename)
+        # one temporary file per thread, threads of a worker can flush at the same time
+        tmp = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(tmp, "w") as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+
+    def clear(self):
+        """Forgets every count written so far, for a server start (before any worker runs)."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _archived(self):
+        """
+        The totals of archive.json, after merging into it the files of processes
+        that are gone. Needs the directory lock.
+        """
+        path = os.path.join(self.directory, ARCHIVE)
+        totals = {}
+        if os.path.exists(path):
+            with open(path) as fp:
+                _add(totals, json.load(fp))
+
+        merged = []
+        for filename in os.listdir(self.directory):
+            pid = filename.split("-", 1)[0]
+            if filename == ARCHIVE or not pid.isdigit() or _alive(int(pid)):
+                continue
+            if filename.endswith(".json"):
+                with open(os.path.join(self.directory, filename)) as fp:
+                    _add(totals, json.load(fp))
+            merged.append(os.path.join(self.directory, filename))  # .tmp files are only removed
+        if merged:
+            with open(path + ".tmp", "w") as fp:
+                json.dump(totals, fp)
+            os.replace(path + ".tmp", path)
+            for dead in merged:
+                os.remove(dead)
+        return totals
+
+    def collect(self):
+        """Totals of every process that wrote to the directory, this one included."""
+        self.flush(force=True)
+        # one collector at a time, so that the file of a dead process is merged exactly once
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            totals = self._archived()
+            for filename in os.listdir(self.directory):
+                if not filename.endswith(".json") or filename == ARCHIVE:
+                    continue
+                try:
+                    with open(os.path.join(self.directory, filename)) as fp:
+                        values = json.load(fp)
+                except (OSError, ValueError):
+                    continue  # a worker replacing its file right now
+                _add(totals, values)
+        return totals
+
+    def render(self):
+        """The collected metrics in the Prometheus text exposition format."""
+        by_name = {}
+        for key, value in self.collect().items():
+            name, labels = json.loads(key)
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for labels, value in sorted(by_name.get(name, [])):
+                if kind == "counter":
+                    lines.append("%s%s %s" % (name, _labels(labels), _number(value)))
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append("%s_bucket%s %d" % (name, _labels(labels + [["le", repr(bound)]]), cumulative))
+                lines.append("%s_bucket%s %d" % (name, _labels(labels + [["le", "+Inf"]]), value[-1]))
+                lines.append("%s_sum%s %s" % (name, _labels(labels), _number(value[-2])))
+                lines.append("%s_count%s %d" % (name, _labels(labels), value[-1]))
+        return "\n".join(lines) + "\n"
+
+    # ------------------------------ wiring ------------------------------
+
+    def init_app(self, app):
+        if not METRICS_ENABLED:
+            return
+
+        @app.before_request
+        def start_timer():
+            g.metrics_started = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            started = g.pop("metrics_started", None)
+            if started is not None:
+                endpoint = request.endpoint or "none"
+                self.inc("http_requests_total", {
+                    "endpoint": endpoint, "method": request.method, "status": str(response.status_code),
+                })
+                self.observe("http_request_duration_seconds", {"endpoint": endpoint, "method": request.method},
+                             time.perf_counter() - started)
+                self.flush()
+            return response
+
+        app.json = timed_provider(type(app.json))(app)
+
+    def attach(self, engine):
+        if not METRICS_ENABLED:
+            return
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info["metrics_started"].pop()
+            labels = {"endpoint": current_endpoint()}
+            self.inc("db_statements_total", labels)
+            self.observe("db_statement_duration_seconds", labels, time.perf_counter() - started)
+
+        @event.listens_for(engine, "handle_error")
+        def discard_timer(context):
+            if context.connection is not None and context.connection.info.get("metrics_started"):
+                context.connection.info["metrics_started"].pop()
+
+
+ARCHIVE = "archive.json"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # someone else's process
+    return True
+
+
+def _add(totals, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            current = totals.setdefault(key, [0] * len(value))
+            totals[key] = [a + b for a, b in zip(current, value)]
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Metrics()
+
+
+def timed_provider(provider_class):
+    """`provider_class` (the app's JSON provider) reporting how long each body took to encode."""
+
+    class TimedJSONProvider(provider_class):
+
+        def dumps(self, obj, **kwargs):
+            started = time.perf_counter()
+            try:
+                return super().dumps(obj, **kwargs)
+            finally:
+                metrics.observe("json_serialization_duration_seconds", {"endpoint": current_endpoint()},
+                                time.perf_counter() - started)
+
+    return TimedJSONProvider
@@ -1,8 +1,39 @@
 
+import re
+import math
+from collections import namedtuple
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+_NUMBER_RANGE = re.compile(r"(-?\d+(?:\.\d+)?)\s*-\s*(-?\d+(?:\.\d+)?)")
+
+
+def parse_number(text):
+    """
+    Parses the numbers SWAPI stores as text ("1,358", "30-165", "unknown").
+    Thousands separators are dropped, ranges keep their lower bound and anything
+    else that is not a finite number gives None.
+    """
+    if text is None:
+        return None
+    cleaned = str(text).replace(",", "").strip()
+    try:
+        value = float(cleaned)
+    except ValueError:
+        match = _NUMBER_RANGE.fullmatch(cleaned)
+        if match is None:
+            return None
+        value = float(match.group(1))
+    return value if math.isfinite(value) else None
+
+
+def numeric_shadow(field):
+    """Column default that fills a `<field>_num` column from the text `field` on INSERT."""
+    def default(context):
+        return parse_number(context.get_current_parameters().get(field))
+    return default
+
 # class User(db.Model):
 #     id = db.db.Column(db.db.Integer, primary_key=True)
 #     email = db.db.Column(db.db.String(120), unique=True, nullable=False)
@@ -28,8 +59,13 @@ class User(db.Model):
 
 class Character(db.Model):
     __tablename__ = 'character'
+    __table_args__ = (
+        db.Index('ix_character_gender_id', 'gender', 'id'),
+        db.Index('ix_character_eye_color_id', 'eye_color', 'id'),
+        db.Index('ix_character_hair_color_id', 'hair_color', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(250))
+    name = db.Column(db.String(250), index=True)
     birth_year = db.Column(db.String(250))
     eye_color = db.Column(db.String(250))
     hair_color = db.Column(db.String(250))
@@ -37,11 +73,17 @@ class Character(db.Model):
     gender = db.Column(db.String(250))
     height = db.Column(db.String(250))
     mass = db.Column(db.String(250))
+    height_num = db.Column(db.Float, index=True, default=numeric_shadow('height'))
+    mass_num = db.Column(db.Float, index=True, default=numeric_shadow('mass'))
 
 class Planet(db.Model):
     __tablename__ = 'planet'
+    __table_args__ = (
+        db.Index('ix_planet_climate_id', 'climate', 'id'),
+        db.Index('ix_planet_terrain_id', 'terrain', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(250))
+    name = db.Column(db.String(250), index=True)
     climate = db.Column(db.String(250))
     diameter = db.Column(db.String(250))
     gravity = db.Column(db.String(250))
@@ -50,11 +92,18 @@ class Planet(db.Model):
     rotation_period = db.Column(db.String(250))
     surface_water = db.Column(db.String(250))
     terrain = db.Column(db.String(250))
+    diameter_num = db.Column(db.Float, index=True, default=numeric_shadow('diameter'))
+    population_num = db.Column(db.Float, index=True, default=numeric_shadow('population'))
 
 class Starship(db.Model):
     __tablename__ = 'starship'
+    __table_args__ = (
+        db.Index('ix_starship_starship_class_id', 'starship_class', 'id'),
+        db.Index('ix_starship_manufacturer_id', 'manufacturer', 'id'),
+        db.Index('ix_starship_model_id', 'model', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(250))
+    name = db.Column(db.String(250), index=True)
     model = db.Column(db.String(250))
     MGLT = db.Column(db.String(250))
     cargo_capacity = db.Column(db.String(250))
@@ -66,21 +115,124 @@ class Starship(db.Model):
     manufacturer = db.Column(db.String(250))
     passangers = db.Column(db.String(250))
     starship_class = db.Column(db.String(250))
+    cargo_capacity_num = db.Column(db.Float, index=True, default=numeric_shadow('cargo_capacity'))
+    cost_in_credits_num = db.Column(db.Float, index=True, default=numeric_shadow('cost_in_credits'))
+    crew_num = db.Column(db.Float, index=True, default=numeric_shadow('crew'))
+    length_num = db.Column(db.Float, index=True, default=numeric_shadow('length'))
+    passangers_num = db.Column(db.Float, index=True, default=numeric_shadow('passangers'))
 
 class Favorite_character(db.Model):
     __tablename__ = 'favorite_character'
+    __table_args__ = (db.Index('ix_favorite_character_user_id_character_id', 'user_id', 'character_id', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     character_id = db.Column(db.Integer, db.ForeignKey('character.id'))
 
 class Favorite_planet(db.Model):
     __tablename__ = 'favorite_planet'
+    __table_args__ = (db.Index('ix_favorite_planet_user_id_planet_id', 'user_id', 'planet_id', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     planet_id = db.Column(db.Integer, db.ForeignKey('planet.id'))
 
 class Favorite_starship(db.Model):
     __tablename__ = 'favorite_starship'
+    __table_args__ = (db.Index('ix_favorite_starship_user_id_starship_id', 'user_id', 'starship_id', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    starship_id = db.Column(db.Integer, db.ForeignKey('starship.id'))
\ No newline at end of file
+    starship_id = db.Column(db.Integer, db.ForeignKey('starship.id'))
+
+
+# one entry per favorite table: the key used in responses, the table, its entity column and the entity model
+FavoriteKind = namedtuple("FavoriteKind", "name model entity_id entity")
+
+FAVORITE_KINDS = (
+    FavoriteKind("characters", Favorite_character, Favorite_character.character_id, Character),
+    FavoriteKind("planets", Favorite_planet, Favorite_planet.planet_id, Planet),
+    FavoriteKind("starships", Favorite_starship, Favorite_starship.starship_id, Starship),
+)
+
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+class Serializer:
+    """
+    Column-only reads for a model: selects plain columns (no ORM objects, no identity
+    map) and turns the result rows straight into JSON-ready dicts.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = tuple(fields)
+        self.columns = tuple(getattr(model, field) for field in self.fields)
+        self.writable = tuple(field for field in self.fields if field != "id")
+
+    def select(self):
+        return db.select(*self.columns)
+
+    def rows(self, result):
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in result]
+
+    def get(self, entity_id):
+        row = db.session.execute(self.select().where(self.model.id == entity_id)).first()
+        return dict(zip(self.fields, row)) if row is not None else None
+
+    def only(self, fields):
+        """A serializer for some of the fields, kept in this one's order. `id` is always included."""
+        wanted = set(fields) | {"id"}
+        return Serializer(self.model, [field for field in self.fields if field in wanted])
+
+    def load(self, data):
+        """Picks the writable fields out of a request body."""
+        return {field: data.get(field) for field in self.writable}
+
+    def create(self, values):
+        """Inserts one row without hydrating it back and returns its serialized form."""
+        result = db.session.execute(db.insert(self.model).values(**values))
+        return {"id": result.inserted_primary_key[0], **values}
+
+
+SERIALIZERS = {
+    Character: Serializer(Character, (
+        "id", "name", "birth_year", "eye_color", "hair_color",
+        "skin_color", "gender", "height", "mass",
+    )),
+    Planet: Serializer(Planet, (
+        "id", "name", "climate", "diameter", "gravity", "orbital_period",
+        "population", "rotation_period", "surface_water", "terrain",
+    )),
+    Starship: Serializer(Starship, (
+        "id", "name", "model", "MGLT", "cargo_capacity", "consumable",
+        "cost_in_credits", "crew", "hyperdrive_rating", "length",
+        "manufacturer", "passangers", "starship_class",
+    )),
+}
+
+
+# text field -> parsed numeric shadow column, used for range filters and numeric sorts
+NUMERIC_FIELDS = {
+    Character: {"height": Character.height_num, "mass": Character.mass_num},
+    Planet: {"diameter": Planet.diameter_num, "population": Planet.population_num},
+    Starship: {
+        "cargo_capacity": Starship.cargo_capacity_num,
+        "cost_in_credits": Starship.cost_in_credits_num,
+        "crew": Starship.crew_num,
+        "length": Starship.length_num,
+        "passangers": Starship.passangers_num,
+    },
+}
+
+
+def with_numeric_shadows(model, row):
+    """Adds the `<field>_num` values to a row for writers that bypass column defaults (COPY)."""
+    for field, column in NUMERIC_FIELDS.get(model, {}).items():
+        row[column.key] = parse_number(row.get(field))
+    return row
+
+
+def serializer_for(model):
+    return SERIALIZERS[model]
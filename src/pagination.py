@@ -0,0 +1,153 @@
+"""
+Keyset (cursor) pagination for the catalog list endpoints.
+
+A page is fetched with `?limit=` and an opaque `?after=` cursor that encodes the
+sort key of the last row returned, so every page is a single indexed range scan
+(`WHERE key > :last ORDER BY key LIMIT n`) no matter how deep the client goes.
+"""
+import os
+import json
+import base64
+from flask import request, jsonify, url_for
+from sqlalchemy import select, tuple_, union_all
+from utils import APIException
+
+DEFAULT_PAGE_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", 50))
+MAX_PAGE_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", 500))
+
+
+def encode_cursor(sort, values):
+    raw = json.dumps({"s": sort, "v": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        values = data["v"]
+        if data["s"] != sort or not isinstance(values, list):
+            raise ValueError(cursor)
+    except (ValueError, KeyError, TypeError):
+        raise APIException("Invalid cursor for this listing", status_code=400)
+    return values
+
+
+class KeysetPage:
+    """Parses the paging arguments of the current request and applies them to a select."""
+
+    def __init__(self, model, sortable=(), args=None):
+        args = request.args if args is None else args
+        self.model = model
+        self.requested = "limit" in args or "after" in args
+
+        try:
+            self.limit = int(args.get("limit", DEFAULT_PAGE_LIMIT))
+        except ValueError:
+            raise APIException("limit must be an integer", status_code=400)
+        if self.limit < 1:
+            raise APIException("limit must be greater than 0", status_code=400)
+        self.limit = min(self.limit, MAX_PAGE_LIMIT)
+
+        # `sortable` lists column names, or maps public names to the column to order by
+        if not isinstance(sortable, dict):
+            sortable = {name: getattr(model, name) for name in sortable}
+        self.sort = args.get("sort", "id")
+        self.descending = self.sort.startswith("-")
+        sort_name = self.sort.lstrip("-")
+        if sort_name != "id" and sort_name not in sortable:
+            raise APIException("Cannot sort by '%s'" % sort_name, status_code=400)
+        self.sort_column = None if sort_name == "id" else sortable[sort_name]
+
+        self.after = decode_cursor(args["after"], self.sort) if "after" in args else None
+        if self.after is not None and not self._valid_cursor(self.after):
+            raise APIException("Invalid cursor for this listing", status_code=400)
+        self.next_cursor = None
+
+    def _valid_cursor(self, values):
+        """[last id] for the id sort, [sort value or null, last id] for a column sort."""
+        if len(values) != (1 if self.sort_column is None else 2):
+            return False
+        if not isinstance(values[-1], int) or isinstance(values[-1], bool):
+            return False
+        if self.sort_column is not None and values[0] is not None:
+            return isinstance(values[0], (str, int, float)) and not isinstance(values[0], bool)
+        return True
+
+    def _direction(self, column):
+        return column.desc() if self.descending else column.asc()
+
+    def _after(self, column, value):
+        return column < value if self.descending else column > value
+
+    def apply(self, stmt):
+        """Adds the ORDER BY and, when paging was requested, the keyset WHERE and LIMIT."""
+        pk = self.model.id
+
+        if self.sort_column is None:
+            stmt = stmt.order_by(self._direction(pk))
+            if self.after is not None:
+                stmt = stmt.where(self._after(pk, self.after[0]))
+        else:
+            column = self.sort_column
+            if column.key not in stmt.selected_columns.keys():
+                # the next cursor is read from the last row, so the sort key has to be selected
+                stmt = stmt.add_columns(column)
+            # NULLs always go last so a cursor that reached them only walks the NULL tail.
+            order = (self._direction(column).nulls_last(), self._direction(pk))
+            if self.after is None:
+                stmt = stmt.order_by(*order)
+            elif self.after[0] is None:
+                stmt = stmt.where(column.is_(None), self._after(pk, self.after[1])).order_by(*order)
+            else:
+                # The rest of the non-NULL values and the start of the NULL tail are two
+                # separate range scans, glued with UNION ALL instead of ORing `IS NULL`
+                # into one predicate (which no index can answer with a single range).
+                value, last_id = self.after
+                rest = stmt.where(self._after(tuple_(column, pk), tuple_(value, last_id)))
+                tail = stmt.where(column.is_(None))
+                # inside a branch the NULL placement is moot, plain index order avoids a sort
+                plain = (self._direction(column), self._direction(pk))
+                branches = union_all(*(
+                    select(*branch.order_by(*plain).limit(self.limit + 1).subquery().c)
+                    for branch in (rest, tail)
+                )).subquery()
+                stmt = select(*branches.c).order_by(
+                    self._direction(branches.c[column.key]).nulls_last(),
+                    self._direction(branches.c[pk.key]),
+                )
+
+        if self.requested:
+            stmt = stmt.limit(self.limit + 1)
+        return stmt
+
+    def finish(self, rows):
+        """Trims the look-ahead row and remembers the cursor for the next page."""
+        rows = list(rows)
+        if self.requested and len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            if self.sort_column is None:
+                values = [last.id]
+            else:
+                values = [getattr(last, self.sort_column.key), last.id]
+            self.next_cursor = encode_cursor(self.sort, values)
+        return rows
+
+    def next_url(self):
+        if self.next_cursor is None:
+            return None
+        args = request.args.to_dict(flat=False)
+        args.update(after=self.next_cursor, limit=self.limit)
+        return url_for(request.endpoint, _external=True, **(request.view_args or {}), **args)
+
+    def respond(self, items):
+        """Plain list for unpaged requests, `{results, next}` envelope plus Link header otherwise."""
+        if not self.requested:
+            return jsonify(items)
+
+        next_url = self.next_url()
+        response = jsonify({"results": items, "next": next_url})
+        if next_url:
+            response.headers["Link"] = '<%s>; rel="next"' % next_url
+        return response
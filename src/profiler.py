@@ -0,0 +1,223 @@
+"""
+Opt-in sampling profiler for live workers.
+
+A request is profiled when it is picked by PROFILE_SAMPLE_RATE (a fraction, 0 by
+default) or when it carries a valid `X-Profile` header. The header is
+`<expires>.<signature>`, an HMAC-SHA256 with PROFILE_SECRET of `<expires>:<path>`,
+so only people holding the secret can profile a given path until `expires` (unix
+time). `flask profile token /character` prints one.
+
+While a profiled request runs, one background thread reads the stack of the
+request's thread every PROFILE_INTERVAL_MS and counts the stacks. When the request
+ends they are written to PROFILE_DIR as collapsed stacks (`frame;frame;frame count`
+per line, the input of flamegraph.pl and speedscope), one file per request named
+after the endpoint. The newest PROFILE_MAX_FILES are kept. GET /profiles lists
+them and /profiles/<name> downloads one, both only with an X-Profile token signed
+for `/profiles` (`flask profile token /profiles`).
+
+Only sync workers are profiled meaningfully: on the ASGI event loop one thread runs
+many requests at once, so their samples would mix.
+"""
+import os
+import sys
+import hmac
+import time
+import random
+import hashlib
+import tempfile
+import threading
+from collections import Counter
+import click
+from flask import request, g
+from flask.cli import AppGroup
+from utils import APIException
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "starwars-profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 2))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
+PROFILE_HEADER = "X-Profile"
+PROFILES_PATH = "/profiles"
+MAX_STACK_DEPTH = 128
+
+
+def sign(path, expires, secret=PROFILE_SECRET):
+    message = ("%d:%s" % (expires, path)).encode("utf-8")
+    return hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def make_token(path, ttl=300, secret=PROFILE_SECRET):
+    expires = int(time.time()) + ttl
+    return "%d.%s" % (expires, sign(path, expires, secret))
+
+
+def verify_token(token, path, secret=PROFILE_SECRET):
+    if not secret or not token:
+        return False
+    expires, _, signature = token.partition(".")
+    try:
+        expires = int(expires)
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature, sign(path, expires, secret))
+
+
+def collapse(frame):
+    """`module:function;...` from the outermost frame to `frame`."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append("%s:%s" % (frame.f_globals.get("__name__", code.co_filename), code.co_name))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """One daemon thread sampling the stacks of every thread currently registered."""
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self._targets = {}    # thread ident -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # threads do not survive the fork of a gunicorn worker
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            if not self._targets:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def start(self, ident):
+        with self._lock:
+            self._targets[ident] = Counter()
+            self._ensure_thread()
+        self._wake.set()
+
+    def stop(self, ident):
+        with self._lock:
+            return self._targets.pop(ident, Counter())
+
+
+class Profiler:
+
+    def __init__(self, directory=PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE, secret=PROFILE_SECRET,
+                 max_files=PROFILE_MAX_FILES):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.max_files = max_files
+        self.sampler = Sampler()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or bool(self.secret)
+
+    def wanted(self):
+        if request.path == PROFILES_PATH or request.path.startswith(PROFILES_PATH + "/"):
+            return False  # the token there is for reading profiles, not for making one
+        token = request.headers.get(PROFILE_HEADER)
+        if token is not None:
+            return verify_token(token, request.path, self.secret)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def require_token(self):
+        """Refuses the request unless it carries a valid X-Profile token for /profiles."""
+        if not verify_token(request.headers.get(PROFILE_HEADER), PROFILES_PATH, self.secret):
+            raise APIException("A valid %s header for %s is required" % (PROFILE_HEADER, PROFILES_PATH),
+                               status_code=403)
+
+    def write(self, endpoint, stacks, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        name = "%s.%s.%d.%dms.folded" % (
+            endpoint, time.strftime("%Y%m%dT%H%M%S"), os.getpid(), elapsed * 1000)
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "w") as fp:
+            for stack, count in stacks.most_common():
+                fp.write("%s %d\n" % (stack, count))
+        os.replace(path + ".tmp", path)
+        self.prune()
+        return name
+
+    def prune(self):
+        files = self.files()
+        for entry in files[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, entry["name"]))
+            except OSError:
+                pass
+
+    def files(self):
+        """Profiles on disk, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".folded"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append({
+                "name": name,
+                # <endpoint>.<time>.<pid>.<ms>ms.folded, and blueprint endpoints have a dot too
+                "endpoint": name.rsplit(".", 4)[0],
+                "size": stat.st_size,
+                "created": stat.st_mtime,
+                "written": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stat.st_mtime)),
+            })
+        entries.sort(key=lambda entry: entry["created"], reverse=True)
+        return entries
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def start_profile():
+            if self.wanted():
+                g.profile_started = time.perf_counter()
+                g.profile_thread = threading.get_ident()
+                self.sampler.start(g.profile_thread)
+
+        @app.teardown_request
+        def stop_profile(exc):
+            started = g.pop("profile_started", None)
+            if started is None:
+                return
+            stacks = self.sampler.stop(g.pop("profile_thread"))
+            if stacks:
+                self.write(request.endpoint or "none", stacks, time.perf_counter() - started)
+
+
+profiler = Profiler()
+
+profile_cli = AppGroup("profile", help="Profiling commands.")
+
+
+@profile_cli.command("token")
+@click.argument("path")
+@click.option("--ttl", default=300, show_default=True, help="Seconds the token stays valid.")
+def token_command(path, ttl):
+    """Print an X-Profile header value that profiles PATH."""
+    if not PROFILE_SECRET:
+        raise click.ClickException("Set PROFILE_SECRET first.")
+    click.echo("%s: %s" % (PROFILE_HEADER, make_token(path, ttl)))
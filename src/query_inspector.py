@@ -0,0 +1,142 @@
+"""
+Per-request SQL accounting, slow-query log and N+1 detection.
+
+Every response carries `X-Query-Count` (statements run while handling it) and a
+`Server-Timing` header with the database time and the total time, so the browser
+devtools or `curl -i` show what a request cost.
+
+Statements slower than SLOW_QUERY_MS are logged with their parameters and the
+database's plan for them (EXPLAIN, or EXPLAIN QUERY PLAN on SQLite).
+
+A request that runs the same SELECT shape (same SQL once parameter lists are
+collapsed) N_PLUS_ONE_THRESHOLD times or more is an N+1: it is logged, and when
+the app is in testing mode (or N_PLUS_ONE_STRICT is set) the request fails with
+NPlusOneError so the test that triggered it fails too.
+"""
+import os
+import re
+import time
+import logging
+from collections import Counter
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+QUERY_INSPECTOR_ENABLED = os.getenv("QUERY_INSPECTOR", "true").lower() in ("1", "true", "yes", "on")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 250))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 3))
+N_PLUS_ONE_STRICT = os.getenv("N_PLUS_ONE_STRICT", "").lower() in ("1", "true", "yes", "on")
+
+EXPLAIN_PREFIX = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN ", "mysql": "EXPLAIN ", "mariadb": "EXPLAIN "}
+
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_SPACE = re.compile(r"\s+")
+_SELECT = re.compile(r"\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def statement_shape(statement):
+    """The statement with IN lists and numbers collapsed, equal for the calls of one N+1 loop."""
+    shape = _PARAMETER_LIST.sub("(?)", statement)
+    shape = _NUMBER.sub("N", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+class QueryStats:
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+
+class QueryInspector:
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, threshold=N_PLUS_ONE_THRESHOLD, strict=N_PLUS_ONE_STRICT):
+        self.slow_query_ms = slow_query_ms
+        self.threshold = threshold
+        self.strict = strict
+
+    def _stats(self):
+        if not has_app_context():
+            return None
+        return g.get("query_stats")
+
+    def explain(self, conn, statement, parameters):
+        prefix = EXPLAIN_PREFIX.get(conn.dialect.name)
+        if prefix is None:
+            return None
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return "\n".join(" | ".join(str(column) for column in row) for row in cursor.fetchall())
+        except Exception as e:
+            return "EXPLAIN failed: %s" % e
+        finally:
+            cursor.close()
+
+    def init_app(self, app):
+        if not QUERY_INSPECTOR_ENABLED:
+            return
+
+        @app.before_request
+        def start_counting():
+            g.query_stats = QueryStats()
+            g.query_started = time.perf_counter()
+
+        @app.after_request
+        def add_headers(response):
+            stats = g.pop("query_stats", None)
+            if stats is None:
+                return response
+            total_ms = (time.perf_counter() - g.pop("query_started")) * 1000
+            response.headers["X-Query-Count"] = str(stats.count)
+            response.headers["Server-Timing"] = 'db;dur=%.1f;desc="%d queries", total;dur=%.1f' % (
+                stats.seconds * 1000, stats.count, total_ms)
+
+            repeated = [(shape, n) for shape, n in stats.shapes.items() if n >= self.threshold]
+            if repeated:
+                message = "N+1 in %s %s: %s" % (request.method, request.path, "; ".join(
+                    "%d x %s" % (n, shape) for shape, n in repeated))
+                if self.strict or app.testing:
+                    raise NPlusOneError(message)
+                logger.warning(message)
+            return response
+
+    def attach(self, engine):
+        if not QUERY_INSPECTOR_ENABLED:
+            return
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["query_started"].pop()
+            is_select = _SELECT.match(statement) is not None
+
+            if elapsed * 1000 >= self.slow_query_ms and not executemany:
+                plan = self.explain(conn, statement, parameters) if is_select else None
+                logger.warning("slow query (%.1f ms): %s\nparameters: %r%s", elapsed * 1000, statement, parameters,
+                               "\nplan:\n" + plan if plan else "")
+
+            stats = self._stats()
+            if stats is not None:
+                stats.count += 1
+                stats.seconds += elapsed
+                if is_select and not executemany:
+                    stats.shapes[statement_shape(statement)] += 1
+
+        @event.listens_for(engine, "handle_error")
+        def discard_timer(context):
+            if context.connection is not None and context.connection.info.get("query_started"):
+                context.connection.info["query_started"].pop()
+
+
+query_inspector = QueryInspector()
@@ -0,0 +1,182 @@
+"""
+Full-text search over character, planet and starship names (plus planet terrain
+and climate, starship model and manufacturer).
+
+The text index is built by migration 25e9b5f068e7: FTS5 tables kept in sync by
+triggers on SQLite, a generated tsvector column with a GIN index on Postgres.
+Every search word is matched as a prefix and all of them must match; results of
+the three kinds are merged and ranked by relevance. bm25 weighs a word by how rare
+it is in its own FTS table, so the raw scores of two kinds are not on the same
+scale: each kind's scores are divided by its best one before merging (ts_rank the
+same way, to rank alike on both databases). A database without the index (built
+with `db.create_all()` instead of the migrations) gets a LIKE scan instead.
+
+Pages are cut with a keyset cursor on (score, kind, id), the same way as the
+catalog lists (see pagination.py), so hits do not shift between pages.
+"""
+import re
+from flask import request, jsonify, url_for
+from sqlalchemy import text
+from utils import APIException
+from pagination import encode_cursor, decode_cursor
+from models import db, Character, Planet, Starship
+
+# kind -> (model, searchable columns), keep in sync with migration 25e9b5f068e7
+SEARCH_FIELDS = {
+    "character": (Character, ("name",)),
+    "planet": (Planet, ("name", "terrain", "climate")),
+    "starship": (Starship, ("name", "model", "manufacturer")),
+}
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_SEARCH_TERMS = 8
+# relevance weight of `name` against the other searchable columns (SQLite bm25)
+NAME_WEIGHT = 10.0
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(query):
+    return _WORD.findall(query.lower())[:MAX_SEARCH_TERMS]
+
+
+def _sqlite_statement(kinds, terms):
+    parts = []
+    for kind in kinds:
+        model, columns = SEARCH_FIELDS[kind]
+        fts = model.__tablename__ + "_fts"
+        weights = ", ".join([str(NAME_WEIGHT)] + ["1.0"] * (len(columns) - 1))
+        parts.append(
+            "SELECT '%s' AS kind, t.id AS id, t.name AS name, -bm25(%s, %s) AS score "
+            'FROM %s JOIN "%s" t ON t.id = %s.rowid WHERE %s MATCH :match'
+            % (kind, fts, weights, fts, model.__tablename__, fts, fts)
+        )
+    # search terms are \w+ only, so quoting them is enough to keep FTS5 syntax out
+    return parts, {"match": " ".join('"%s"*' % term for term in terms)}
+
+
+def _postgresql_statement(kinds, terms):
+    parts = [
+        "SELECT '%s' AS kind, t.id AS id, t.name AS name, ts_rank(t.search, query) AS score "
+        "FROM \"%s\" t, to_tsquery('simple', :tsquery) query WHERE t.search @@ query"
+        % (kind, SEARCH_FIELDS[kind][0].__tablename__)
+        for kind in kinds
+    ]
+    return parts, {"tsquery": " & ".join(term + ":*" for term in terms)}
+
+
+# engines where the text index was found; a missing one is looked for again on the
+# next search, so running the migration does not need a restart
+_indexed_engines = set()
+
+
+def has_text_index(bind):
+    """Whether migration 25e9b5f068e7 built the text index on this database (one query)."""
+    engine = bind.engine
+    if engine in _indexed_engines:
+        return True
+    tables = [model.__tablename__ for model, _ in SEARCH_FIELDS.values()]
+    marks = ", ".join(":t%d" % i for i in range(len(tables)))
+    params = {"t%d" % i: table for i, table in enumerate(tables)}
+    if engine.dialect.name == "sqlite":
+        sql = "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s)" % marks
+        params = {key: table + "_fts" for key, table in params.items()}
+    elif engine.dialect.name == "postgresql":
+        sql = ("SELECT count(*) FROM information_schema.columns "
+               "WHERE column_name = 'search' AND table_schema = current_schema() AND table_name IN (%s)" % marks)
+    else:
+        return False
+    if db.session.execute(text(sql), params).scalar() != len(tables):
+        return False
+    _indexed_engines.add(engine)
+    return True
+
+
+def _fallback_statement(kinds, terms):
+    # databases without a text index: correct but a full scan, only meant for development
+    parts = []
+    params = {}
+    for kind in kinds:
+        model, columns = SEARCH_FIELDS[kind]
+        conditions = []
+        for i, term in enumerate(terms):
+            params["term%d" % i] = "%" + term + "%"
+            conditions.append("(%s)" % " OR ".join("lower(t.%s) LIKE :term%d" % (c, i) for c in columns))
+        parts.append(
+            "SELECT '%s' AS kind, t.id AS id, t.name AS name, 0.0 AS score FROM \"%s\" t WHERE %s"
+            % (kind, model.__tablename__, " AND ".join(conditions))
+        )
+    return parts, params
+
+
+def search_catalog(query, kinds, limit, after=None):
+    """
+    Returns up to `limit` + 1 ranked {type, id, name, score} hits, the ones ranked
+    after the `(score, kind, id)` of `after` when it is given.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    bind = db.session.get_bind()
+    if not has_text_index(bind):
+        parts, params = _fallback_statement(kinds, terms)
+        hits = " UNION ALL ".join(parts)
+    else:
+        if bind.dialect.name == "sqlite":
+            parts, params = _sqlite_statement(kinds, terms)
+        else:
+            parts, params = _postgresql_statement(kinds, terms)
+        # the best hit of every kind scores 1.0; normalized inside `hits` so the cursor compares the same value
+        hits = (
+            "SELECT kind, id, name, coalesce(score / nullif(max(score) OVER (PARTITION BY kind), 0), 0) AS score "
+            "FROM (%s) ranked" % " UNION ALL ".join(parts)
+        )
+
+    sql = "SELECT kind, id, name, score FROM (%s) hits" % hits
+    if after is not None:
+        # ordered by score descending, so the score is negated to compare the rows ascending
+        sql += " WHERE (-score, kind, id) > (:after_score, :after_kind, :after_id)"
+        params.update(after_score=-after[0], after_kind=after[1], after_id=after[2])
+    sql += " ORDER BY score DESC, kind, id LIMIT :limit"
+    params.update(limit=limit + 1)
+    return [
+        {"type": kind, "id": entity_id, "name": name, "score": float(score)}
+        for kind, entity_id, name, score in db.session.execute(text(sql), params)
+    ]
+
+
+def search_view():
+    """GET /search?q=<words>[&kind=character,planet][&limit=n][&after=cursor]"""
+    query = request.args.get("q", "").strip()
+    if not query:
+        raise APIException("q is required", status_code=400)
+
+    kinds = [k for arg in request.args.getlist("kind") for k in arg.split(",") if k] or list(SEARCH_FIELDS)
+    unknown = set(kinds) - set(SEARCH_FIELDS)
+    if unknown:
+        raise APIException("Unknown kind: %s" % ", ".join(sorted(unknown)), status_code=400)
+
+    try:
+        limit = min(int(request.args.get("limit", DEFAULT_SEARCH_LIMIT)), MAX_SEARCH_LIMIT)
+    except ValueError:
+        raise APIException("limit must be an integer", status_code=400)
+    if limit < 1:
+        raise APIException("limit must be greater than 0", status_code=400)
+    after = None
+    if "after" in request.args:
+        after = decode_cursor(request.args["after"], "search")
+        if (len(after) != 3 or isinstance(after[0], bool) or not isinstance(after[0], (int, float))
+                or not isinstance(after[1], str) or not isinstance(after[2], int)):
+            raise APIException("Invalid cursor for this listing", status_code=400)
+
+    hits = search_catalog(query, kinds, limit, after)
+    next_url = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        last = hits[-1]
+        args = request.args.to_dict(flat=False)
+        args.update(after=encode_cursor("search", [last["score"], last["type"], last["id"]]), limit=limit)
+        next_url = url_for(request.endpoint, _external=True, **args)
+
+    return jsonify({"results": hits, "next": next_url})
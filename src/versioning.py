@@ -0,0 +1,113 @@
+"""
+Per-table version stamps for the catalog, used to answer conditional GETs.
+
+Every write that goes through the API bumps the version of its table in the same
+transaction, so an ETag made of (table, version) changes whenever the data does
+and a matching If-None-Match can be answered with a 304 after a single primary
+key lookup, without reading or serializing any catalog rows.
+"""
+import os
+from functools import wraps
+from datetime import datetime, timezone
+from flask import request, g, make_response, Response
+from models import db, CatalogVersion
+
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", 0))
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def bump_version(model):
+    """Increments the version of `model`'s table and returns the new one. The caller commits."""
+    table = model.__tablename__
+    result = db.session.execute(
+        db.update(CatalogVersion)
+        .where(CatalogVersion.table_name == table)
+        .values(version=CatalogVersion.version + 1, updated_at=_utcnow())
+    )
+    if result.rowcount == 0:
+        db.session.execute(db.insert(CatalogVersion).values(table_name=table, version=1, updated_at=_utcnow()))
+        return 1
+    # the row is ours until the commit, so this is the version our write produced
+    return db.session.execute(version_select(model)).first()[0]
+
+
+def version_select(model):
+    return (
+        db.select(CatalogVersion.version, CatalogVersion.updated_at)
+        .where(CatalogVersion.table_name == model.__tablename__)
+    )
+
+
+def version_from_row(row):
+    if row is None:
+        return 0, None
+    version, updated_at = row
+    return version, updated_at.replace(tzinfo=timezone.utc) if updated_at else None
+
+
+def current_version(model):
+    """Returns (version, last_modified) for `model`'s table."""
+    return version_from_row(db.session.execute(version_select(model)).first())
+
+
+def current_versions(models):
+    """Returns {table name: version} for several tables with a single query."""
+    tables = [model.__tablename__ for model in models]
+    versions = dict.fromkeys(tables, 0)
+    versions.update(db.session.execute(
+        db.select(CatalogVersion.table_name, CatalogVersion.version).where(CatalogVersion.table_name.in_(tables))
+    ).all())
+    return versions
+
+
+def make_etag(model, version):
+    return "%s.%d" % (model.__tablename__, version)
+
+
+def is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = CATALOG_MAX_AGE
+    response.cache_control.must_revalidate = True
+    return response
+
+
+def conditional(model):
+    """
+    Decorates a catalog GET view with ETag / Last-Modified validators and answers
+    304 Not Modified without calling the view when the client is up to date.
+
+    The version is read before the view runs: a write landing in between can only
+    pair newer rows with an older ETag, which costs the client one extra refetch,
+    never a stale 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version, last_modified = current_version(model)
+            etag = make_etag(model, version)
+            g.catalog_version = version
+            g.catalog_modified = last_modified
+
+            if is_not_modified(etag, last_modified):
+                return set_validators(Response(status=304), etag, last_modified)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
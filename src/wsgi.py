@@ -1,7 +1,18 @@
 # This file was created to run the application on heroku using gunicorn.
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
 
-from app import app as application
+import logging
+from app import create_app
+from autocomplete import autocomplete_index
+
+application = create_app()
+
+# build the name index while the worker boots rather than on the first keystroke
+with application.app_context():
+    try:
+        autocomplete_index.warm()
+    except Exception:
+        logging.getLogger(__name__).exception("autocomplete warm-up failed, it will load on first use")
 
 if __name__ == "__main__":
     application.run()
@@ -0,0 +1,64 @@
+"""
+The application modules live flat inside ./src/ (that is how gunicorn imports
+them), so make them importable, and keep every test away from the shared caches
+in the temp directory, before anything imports them.
+
+Run the tests from the project root:  python -m pytest
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+SCRATCH = tempfile.mkdtemp(prefix="starwars-tests-")
+os.environ["RESPONSE_CACHE_URL"] = "none"
+os.environ["METRICS_DIR"] = os.path.join(SCRATCH, "metrics")
+os.environ.pop("FLASK_RUN_FROM_CLI", None)
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    from autocomplete import autocomplete_index
+    from models import db, User, Character, Planet, Starship, Favorite_character, Favorite_planet, Favorite_starship
+
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "BCRYPT_LOG_ROUNDS": 4,
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(Character), [
+            {"name": "Luke Skywalker", "gender": "male", "height": "172", "mass": "77", "eye_color": "blue"},
+            {"name": "Leia Organa", "gender": "female", "height": "150", "mass": "49", "eye_color": "brown"},
+            {"name": "Yoda", "gender": "male", "height": "66", "mass": "unknown", "eye_color": "brown"},
+        ])
+        db.session.execute(db.insert(Planet), [
+            {"name": "Tatooine", "climate": "arid", "terrain": "desert", "diameter": "10465"},
+            {"name": "Hoth", "climate": "frozen", "terrain": "tundra", "diameter": "7200"},
+        ])
+        db.session.execute(db.insert(Starship), [
+            {"name": "X-wing", "model": "T-65 X-wing", "starship_class": "starfighter", "crew": "1"},
+            {"name": "Millennium Falcon", "model": "YT-1300", "starship_class": "freighter", "crew": "4"},
+        ])
+        db.session.add(User(username="luke", mail="luke@example.com", password="not-a-hash"))
+        db.session.flush()
+        db.session.add_all([Favorite_character(user_id=1, character_id=i) for i in (1, 2, 3)])
+        db.session.add_all([Favorite_planet(user_id=1, planet_id=i) for i in (1, 2)])
+        db.session.add_all([Favorite_starship(user_id=1, starship_id=i) for i in (1, 2)])
+        db.session.commit()
+    # the index is a process-wide singleton, it must not answer from the previous test's database
+    autocomplete_index.reset()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,52 @@
+"""
+The prefix index keeps up with this process's own writes without reloading, and
+rebuilds a kind only when another process wrote to it.
+"""
+import pytest
+from autocomplete import autocomplete_index
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Records every kind the index reads from the database."""
+    calls = []
+    original = autocomplete_index._load
+
+    def spy(kind, version):
+        calls.append(kind)
+        return original(kind, version)
+
+    monkeypatch.setattr(autocomplete_index, "_load", spy)
+    monkeypatch.setattr(autocomplete_index, "background", False)
+    monkeypatch.setattr(autocomplete_index, "refresh_seconds", 0)
+    return calls
+
+
+def names(response):
+    return [hit["name"] for hit in response.get_json()]
+
+
+def test_own_writes_do_not_reload(client, loads):
+    assert names(client.get("/autocomplete?kind=character&prefix=l")) == ["Leia Organa", "Luke Skywalker"]
+    assert loads == ["character"]
+
+    assert client.post("/character", json={"name": "Lando Calrissian"}).status_code == 200
+    assert names(client.get("/autocomplete?kind=character&prefix=la")) == ["Lando Calrissian"]
+    assert client.delete("/character/2").status_code == 200
+    assert names(client.get("/autocomplete?kind=character&prefix=l")) == ["Lando Calrissian", "Luke Skywalker"]
+    assert loads == ["character"]
+
+
+def test_foreign_write_rebuilds(app, client, loads):
+    from models import db, Planet
+    from versioning import bump_version
+
+    assert names(client.get("/autocomplete?kind=planet&prefix=d")) == []
+    # another worker: the row and the version change, but nothing reaches this index
+    with app.app_context():
+        db.session.add(Planet(name="Dagobah"))
+        bump_version(Planet)
+        db.session.commit()
+
+    assert names(client.get("/autocomplete?kind=planet&prefix=d")) == ["Dagobah"]
+    assert loads == ["planet", "planet"]
@@ -0,0 +1,28 @@
+"""The shared response cache (see cache.py)."""
+import pytest
+
+
+@pytest.fixture
+def cached_client(app, client, tmp_path, monkeypatch):
+    from cache import response_cache, SQLiteCache
+    monkeypatch.setattr(response_cache, "backend", SQLiteCache(str(tmp_path / "cache.db")))
+    return client
+
+
+def test_second_request_is_served_from_the_cache(cached_client):
+    from cache import response_cache
+    first = cached_client.get("/character?gender=male")
+    second = cached_client.get("/character?gender=male")
+    assert first.data == second.data
+    assert response_cache.stats()["hits"] == 1
+
+
+def test_escaped_separators_do_not_share_a_key(cached_client):
+    # one value containing "&" and "=" against the two filters it spells out
+    poisoned = cached_client.get("/character?gender=female%26gender%3Dmale")
+    assert poisoned.status_code == 200
+    assert poisoned.get_json() == []
+
+    genuine = cached_client.get("/character?gender=female&gender=male")
+    assert genuine.status_code == 200
+    assert {row["gender"] for row in genuine.get_json()} == {"female", "male"}
@@ -0,0 +1,29 @@
+"""
+A cursor that decodes but does not fit the listing is the client's mistake: 400,
+never a 500 from the query it would have built.
+"""
+import pytest
+from pagination import encode_cursor
+
+
+@pytest.mark.parametrize("sort, values", [
+    ("id", []),
+    ("id", [1, 2]),
+    ("id", ["1"]),
+    ("id", [True]),
+    ("id", [{"a": 1}]),
+    ("name", ["x"]),
+    ("name", [None]),
+    ("name", ["x", None]),
+    ("name", [["x"], 1]),
+    ("name", [False, 1]),
+])
+def test_malformed_cursor_is_rejected(client, sort, values):
+    response = client.get("/character?limit=1&sort=%s&after=%s" % (sort, encode_cursor(sort, values)))
+    assert response.status_code == 400
+
+
+def test_cursor_after_nulls(client):
+    response = client.get("/character?limit=5&sort=name&after=%s" % encode_cursor("name", [None, 0]))
+    assert response.status_code == 200
+    assert response.get_json()["results"] == []
@@ -0,0 +1,67 @@
+"""
+The read endpoints under TESTING, where the query inspector turns an N+1 into an
+NPlusOneError that the test client raises (see query_inspector.py).
+"""
+import pytest
+
+CATALOG_PATHS = [
+    "/character",
+    "/character?limit=2",
+    "/character?limit=1&sort=-height",
+    "/character?gender=male&fields=name",
+    "/character/1",
+    "/planet",
+    "/planet?limit=1&sort=diameter",
+    "/planets/1",
+    "/starship",
+    "/starship?limit=1&sort=name",
+    "/starship/2",
+]
+FAVORITES_PATHS = [
+    "/favorites/1",
+    "/favorites/1?expand=true",
+]
+AUTOCOMPLETE_PATHS = [
+    "/autocomplete?prefix=l",
+    "/autocomplete?prefix=l",
+    "/autocomplete?prefix=ho&kind=planet",
+]
+
+
+@pytest.mark.parametrize("path", CATALOG_PATHS + FAVORITES_PATHS)
+def test_reads_do_not_raise(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    assert int(response.headers["X-Query-Count"]) >= 1
+
+
+def test_autocomplete_does_not_raise(client):
+    for path in AUTOCOMPLETE_PATHS:
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.get_json()
+
+
+def test_catalog_pages_do_not_raise(client):
+    url = "/character?limit=1&sort=height"
+    pages = 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        url = response.get_json()["next"]
+        pages += 1
+    assert pages == 3
+
+
+def test_n_plus_one_raises(app, client):
+    from models import db, Character
+    from query_inspector import NPlusOneError
+
+    @app.route("/n-plus-one")
+    def n_plus_one():
+        for character_id in (1, 2, 3):
+            db.session.execute(db.select(Character.name).where(Character.id == character_id)).scalar()
+        return "ok"
+
+    with pytest.raises(NPlusOneError):
+        client.get("/n-plus-one")